@@ -9,11 +9,20 @@ import properties
 import numpy as np
 
 from scipy.stats import ttest_ind
+from scipy.signal import fftconvolve
 
 from krippendorff import alpha as kr_alpha
 
 sep_chars = ".:"
 
+# Largest factor tried when mapping values onto an integer lattice for exact
+# permutation tests (divisible by every denominator from 1 to 8)
+MAX_LATTICE_SCALE = 840
+
+# Upper bound on the subset-sum table cells an exact permutation test may use
+# before falling back to Monte Carlo trials
+EXACT_BUDGET = 5*10**7
+
 ALIASES = properties.reverse_aliases()
 
 def get(row, index, default=None):
@@ -680,6 +689,29 @@ def main(fin):
   print('='*80)
   print("Loading data...")
   data = json.loads(fin.read())
+
+  n_trials = 100
+  if len(sys.argv) > 1:
+      try:
+          n_trials = int(sys.argv[1])
+      except:
+          print(
+              f"Warning: invalid number of trials: {sys.argv[1]};"
+              f" defaulting to 100 trials per test."
+          )
+
+  results = run_tests(data, n_trials)
+  with open(f"tests-{n_trials}.json", 'w') as fout:
+      json.dump(results, fout)
+  print('-'*80)
+  print("...testing complete.")
+  print('='*80)
+
+def run_tests(data, n_trials=100):
+  """
+  Runs the hypothesis tests on grouped data (as from group.py), returning
+  the rows and test results that go in tests-N.json.
+  """
   print("Transforming data...")
   records = data["records"]
   fields = data["fields"]
@@ -701,15 +733,6 @@ def main(fin):
       use.__name__
     )
   )
-  n_trials = 100
-  if len(sys.argv) > 1:
-      try:
-          n_trials = int(sys.argv[1])
-      except:
-          print(
-              f"Warning: invalid number of trials: {sys.argv[1]};"
-              f" defaulting to 100 trials per test."
-          )
   tests = init_tests(rows, full_hypotheses, use, trials=n_trials)
   #print('-'*80)
   #print(
@@ -725,11 +748,7 @@ def main(fin):
   #    char=True,
   #    trials=n_trials
   #)
-  with open(f"tests-{n_trials}.json", 'w') as fout:
-      json.dump({"rows": rows, "tests": tests}, fout)
-  print('-'*80)
-  print("...testing complete.")
-  print('='*80)
+  return {"rows": rows, "tests": tests}
 
 class Undefined:
   pass
@@ -741,8 +760,20 @@ def bootstrap_test(
   alt_filter=None,
   extras=None,
   trials=100,
-  seed=1081230891
+  seed=1081230891,
+  exact=True
 ):
+  """
+  Permutation test for a difference in means between rows matching
+  pos_filter and rows matching alt_filter (or all other rows), shuffling
+  values only within the strata defined by the "controls" extra. Returns the
+  mean difference and a p-value.
+
+  If exact is True and every row in each stratum is either positive or
+  alternate, the p-value is computed exactly from the null distribution of
+  the positive sum (see exact_p_value); otherwise, or if that would be too
+  expensive, trials random shuffles are used.
+  """
   if not extras:
     extras = {}
   controls = extras.get("controls", [])
@@ -803,6 +834,11 @@ def bootstrap_test(
     # abs(mean difference) >= 0
     return 0, 1
 
+  if exact:
+    p = exact_p_value(groups, md)
+    if p != None:
+      return md, p
+
   random.seed(seed)
   as_diff = 0
   for t in range(trials):
@@ -823,6 +859,122 @@ def bootstrap_test(
 
   return md, as_diff / trials
 
+def lattice_scale(vals):
+  """
+  Returns the smallest integer factor (up to MAX_LATTICE_SCALE) that turns
+  every value into an integer, or None if there isn't one.
+  """
+  vals = np.asarray(vals, dtype=float)
+  for scale in range(1, MAX_LATTICE_SCALE + 1):
+    scaled = vals * scale
+    if np.allclose(scaled, np.round(scaled), rtol=0, atol=1e-6):
+      return scale
+  return None
+
+def subset_sum_distribution(ints, k):
+  """
+  Returns (offset, dist) where dist[s] is the probability that a uniformly
+  random k-element subset of the given integers sums to offset + s.
+  """
+  ints = np.asarray(ints, dtype=int)
+  n = len(ints)
+  if k > n - k:
+    # Cheaper to work with the complement, whose sum mirrors ours:
+    c_offset, c_dist = subset_sum_distribution(ints, n - k)
+    total = int(ints.sum())
+    return total - c_offset - (len(c_dist) - 1), c_dist[::-1]
+
+  low = int(ints.min()) if n else 0
+  shifted = ints - low
+  top = int(np.sort(shifted)[n-k:].sum()) if k else 0
+  # counts[j, s] * exp(logs[j]) is the number of j-element subsets seen so
+  # far summing to s; rows are rescaled as they grow, since the raw counts
+  # (up to n choose k) overflow float64 for large strata.
+  counts = np.zeros((k + 1, top + 1))
+  counts[0, 0] = 1
+  logs = np.zeros(k + 1)
+  for v in shifted:
+    if v <= top and k:
+      common = np.maximum(logs[1:], logs[:-1])
+      grown = counts[1:] * np.exp(logs[1:] - common)[:, None]
+      grown[:, v:] += (
+        counts[:-1, :top + 1 - v] * np.exp(logs[:-1] - common)[:, None]
+      )
+      peaks = grown.max(axis=1)
+      peaks[peaks == 0] = 1
+      counts[1:] = grown / peaks[:, None]
+      logs[1:] = common + np.log(peaks)
+  dist = counts[k] / counts[k].sum()
+  return k * low, dist
+
+def exact_p_value(groups, md, budget=EXACT_BUDGET):
+  """
+  Computes an exact permutation p-value for the mean difference md given the
+  per-stratum [vals, hits, alts] lists built by bootstrap_test. Within each
+  stratum the positive sum of a relabeling follows a subset-sum distribution;
+  those are combined across strata by FFT convolution. Because each row must
+  be either positive or alternate, the mean difference is monotone in the
+  positive sum, so the p-value is a tail of that distribution.
+
+  Returns None when the test isn't applicable (overlapping or partial
+  labels, or values that don't sit on a small integer lattice), when the
+  subset-sum tables would exceed the given budget of cells, or when the
+  distribution can't be computed in floating point.
+  """
+  everything = []
+  for vals, hits, alts in groups.values():
+    if len(hits) + len(alts) != len(vals) or set(hits) & set(alts):
+      return None
+    everything.extend(vals)
+
+  scale = lattice_scale(everything)
+  if scale == None:
+    return None
+
+  strata = []
+  cost = 0
+  observed = 0
+  for vals, hits, alts in groups.values():
+    ints = np.round(np.asarray(vals, dtype=float) * scale).astype(int)
+    observed += int(ints[hits].sum())
+    k = min(len(hits), len(vals) - len(hits))
+    if k > 0:
+      spread = int(ints.max() - ints.min())
+      cost += len(ints) * (k + 1) * (k * spread + 1)
+    strata.append((ints, len(hits)))
+
+  if cost > budget:
+    return None
+
+  offset = 0
+  dists = []
+  for ints, k in strata:
+    sub_offset, dist = subset_sum_distribution(ints, k)
+    offset += sub_offset
+    dists.append(dist)
+
+  if not all(np.all(np.isfinite(dist)) for dist in dists):
+    return None
+
+  # Pairwise reduction keeps the FFTs balanced:
+  while len(dists) > 1:
+    paired = []
+    for i in range(0, len(dists) - 1, 2):
+      joint = np.clip(fftconvolve(dists[i], dists[i+1]), 0, None)
+      paired.append(joint / joint.sum())
+    if len(dists) % 2:
+      paired.append(dists[-1])
+    dists = paired
+  dist = dists[0]
+
+  idx = observed - offset
+  if md > 0:
+    p = dist[max(idx, 0):].sum()
+  else:
+    p = dist[:max(idx + 1, 0)].sum()
+
+  return float(min(max(p, 0), 1))
+
 def t_test(
   rows,
   index,
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+clean.py
+
+Filters raw MTurk batch files in a single CSV-aware pass, replacing the
+grep/sed/tr pipeline that used to produce batches/filtered-batch-*.csv:
+
+  - rejected assignments (any field mentioning "Rejected") are dropped
+  - submissions from workers listed in reject.lst are dropped
+  - line breaks inside fields are normalized: CRLF becomes LF, lone CRs
+    become spaces, and blank lines are removed
+  - Answer.identification_* columns are renamed to Answer.similarity_*
+
+process.py reads batch files through read_clean when given "--reject", so
+the filtered rows never need to be written out. Run directly as
+
+  ./clean.py reject.lst batches/batch-1.csv > batches/filtered-batch-1.csv
+
+to write a filtered copy of a batch file.
+"""
+
+import csv
+import re
+import sys
+
+REJECT_FILE = "reject.lst"
+
+# Old column name prefixes and their replacements
+RENAMES = [
+  ("Answer.identification_", "Answer.similarity_"),
+]
+
+BLANK_LINES = re.compile(r'\n+')
+
+def read_rejects(filename=REJECT_FILE):
+  """
+  Reads a file of worker IDs (one per line) into a set.
+  """
+  with open(filename, 'r') as fin:
+    return set(line.strip() for line in fin if line.strip())
+
+def rename(column):
+  for old, new in RENAMES:
+    if column.startswith(old):
+      return new + column[len(old):]
+  return column
+
+def clean_field(value):
+  """
+  Normalizes the line breaks in a field value.
+  """
+  value = value.replace("\r\n", "\n").replace("\r", " ")
+  return BLANK_LINES.sub("\n", value)
+
+def clean_rows(filename, rejects=frozenset()):
+  """
+  Reads a batch file (tab-separated if its name ends with .tsv), yielding
+  its renamed header and then the cleaned fields of each row that isn't
+  rejected or from a worker in the given set.
+  """
+  dialect = "excel-tab" if filename.endswith(".tsv") else "excel"
+  with open(filename, 'r', newline='') as fin:
+    reader = csv.reader(fin, dialect=dialect)
+    header = [rename(col) for col in next(reader)]
+    yield header
+
+    worker = header.index("WorkerId")
+    for row in reader:
+      if not any(row):
+        continue
+      if row[worker] in rejects:
+        continue
+      if any("Rejected" in field for field in row):
+        continue
+      yield [clean_field(field) for field in row]
+
+def read_clean(filename, rejects=frozenset()):
+  """
+  Like clean_rows, but yields each row as a dictionary keyed by column name
+  (like csv.DictReader).
+  """
+  rows = clean_rows(filename, rejects)
+  header = next(rows)
+  for row in rows:
+    # Short rows are missing their trailing fields
+    yield dict(zip(header, row + [""] * (len(header) - len(row))))
+
+def main():
+  if len(sys.argv) != 3:
+    print("Usage: clean.py REJECT_FILE BATCH_FILE", file=sys.stderr)
+    sys.exit(1)
+
+  rejects = read_rejects(sys.argv[1])
+  writer = csv.writer(sys.stdout, quoting=csv.QUOTE_ALL, lineterminator='\n')
+  writer.writerows(clean_rows(sys.argv[2], rejects))
+
+if __name__ == "__main__":
+  main()
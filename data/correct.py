@@ -158,19 +158,29 @@ def analyze_agreement(rows):
 
 
 def main(tests):
-    rows = tests["rows"]
-    tests = tests["tests"]
-
     suffix = ""
     if len(sys.argv) > 1:
         suffix = "-" + sys.argv[1]
 
-    print('-'*80)
-    print("Analyzing tests...")
-    effects, expected = analyze_tests(rows, tests)
+    effects, expected = correct(tests)
     # Dump into a file
     with open(f"analysis_results{suffix}.json", 'w') as fout:
       json.dump([effects, expected], fout)
+    summarize(effects, expected, tests["rows"])
+
+def correct(tests):
+    """
+    Corrects test results (as from analyze.run_tests) for multiple
+    comparisons, returning (effects, expected).
+    """
+    print('-'*80)
+    print("Analyzing tests...")
+    return analyze_tests(tests["rows"], tests["tests"])
+
+def summarize(effects, expected, rows):
+    """
+    Prints a summary of corrected results and of rating agreement.
+    """
     print('-'*80)
     summarize_tests(effects, expected, analyze.hgroups)
     print('-'*80)
@@ -5,29 +5,119 @@ find_holy.py
 Finds rows of batch files where more than x% of answers are missing, and print
 the corresponding worker IDs. It also prints the number of missing answers, the
 total number of answer columns, and the HIT status for each row.
+
+With "--reject", instead prints the worker IDs to exclude from analysis (for
+reject.lst): every worker from the "--pilot" files, every worker with more than
+one submission across the pilot and batch files, and every worker found as
+above in the batch files. Rejected submissions don't count as submissions.
+
+Files are scanned in parallel with "-j WORKERS".
 """
 
-import sys
+import argparse
+import collections
 import csv
+import multiprocessing
+
+import numpy as np
 
 THRESHOLD = 0.15
 
-def main(filenames):
-  for f in filenames:
-    with open(f, 'r') as fin:
-      reader = csv.DictReader(fin)
-      for row in reader:
-        answers = [k for k in row if k.startswith("Answer.")]
-        missing = [row[k] for k in answers if row[k] in ["", "{}", None]]
-        if len(missing) / len(answers) > THRESHOLD:
-          print(
-            row["WorkerId"],
-            len(missing),
-            len(answers),
-            row["AssignmentStatus"],
-            sep='\t'
-          )
+# Answer values that count as missing
+MISSING = ["", "{}"]
+
+def answer_columns(header):
+  """
+  Returns the indices of the answer columns in a batch file header.
+  """
+  return [i for i, col in enumerate(header) if col.startswith("Answer.")]
+
+def scan_batch(filename, threshold=THRESHOLD):
+  """
+  Reads a batch file, returning (workers, holy) where workers lists the
+  worker IDs of rows that weren't rejected and holy lists (worker ID,
+  missing answers, answer columns, assignment status) tuples for rows missing
+  more than the given fraction of their answers.
+  """
+  with open(filename, 'r', newline='') as fin:
+    reader = csv.reader(fin)
+    header = next(reader)
+    # Blank lines would have no worker ID or status
+    rows = [tuple(row) for row in reader if any(row)]
+
+  answers = answer_columns(header)
+  worker = header.index("WorkerId")
+  status = header.index("AssignmentStatus")
+
+  # Short rows are missing their trailing answers
+  values = np.array(
+    [
+      [row[i] if i < len(row) else "" for i in answers]
+        for row in rows
+    ],
+    dtype=object
+  ).reshape(len(rows), len(answers))
+  missing = np.isin(values, MISSING).sum(axis=1)
+
+  workers = [
+    row[worker] for row in rows
+      if not any("Rejected" in field for field in row)
+  ]
+  holy = [
+    (row[worker], int(n), len(answers), row[status])
+      for row, n in zip(rows, missing)
+      if n / len(answers) > threshold
+  ]
+  return workers, holy
+
+def scan_batches(filenames, workers=1):
+  """
+  Scans the given batch files (in parallel with the given number of worker
+  processes, or all available cores if None), returning their scan_batch
+  results in order.
+  """
+  if workers == 1 or len(filenames) < 2:
+    return [scan_batch(f) for f in filenames]
+  with multiprocessing.Pool(workers) as pool:
+    return pool.map(scan_batch, filenames)
+
+def reject_list(pilots, batches, workers=1):
+  """
+  Returns the worker IDs to reject given pilot and batch files: pilot
+  workers, repeat participants, and workers with too many missing answers in
+  the batches. IDs can appear more than once.
+  """
+  results = scan_batches(pilots + batches, workers)
+  pilot_results = results[:len(pilots)]
+  batch_results = results[len(pilots):]
+
+  rejected = [w for found, _ in pilot_results for w in found]
+
+  submissions = collections.Counter(w for found, _ in results for w in found)
+  rejected.extend(sorted(w for w, n in submissions.items() if n > 1))
+
+  rejected.extend(row[0] for _, holy in batch_results for row in holy)
+  return rejected
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Finds submissions with too many missing answers."
+  )
+  parser.add_argument("batches", nargs='+', metavar="BATCH")
+  parser.add_argument("--reject", action="store_true")
+  parser.add_argument("--pilot", action="append", default=[], metavar="FILE")
+  parser.add_argument("-j", "--workers", type=int, default=1)
+  args = parser.parse_args()
+
+  workers = None if args.workers == 0 else args.workers
+  if args.reject:
+    for worker in reject_list(args.pilot, args.batches, workers):
+      print(worker)
+    return
+
+  for _, holy in scan_batches(args.batches, workers):
+    for row in holy:
+      print(*row, sep='\t')
 
 if __name__ == "__main__":
-  targets = sys.argv[1:]
-  main(targets)
+  main()
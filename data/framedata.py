@@ -1,21 +1,168 @@
 """
 framedata.py
 
-Reads in frame data from framedata.json file.
+Reads in frame data, computed by ../framedata/process.py.
 
-Run make in ../framedata to produce framedata.json file and copy it over
-manually.
+If ../framedata/characterData.json is available, stats are kept in
+framedata-cache.json along with hashes of the inputs they were derived from
+(characterData.json, all_chars.csv, and process.py itself along with the
+framedata modules it imports, plus each character's own slice of those). When
+the inputs change, only the characters whose data changed are re-analyzed.
+Otherwise, this falls back to a framedata.json file in the current directory
+(run make in ../framedata to produce one and copy it over manually).
 """
 
+import ast
+import contextlib
+import hashlib
+import importlib.util
 import json
+import os
+import sys
+
+FRAMEDATA_DIR = os.path.join(
+  os.path.dirname(os.path.abspath(__file__)),
+  "..",
+  "framedata"
+)
+PROCESS_FILE = os.path.join(FRAMEDATA_DIR, "process.py")
+DATA_FILE = os.path.join(FRAMEDATA_DIR, "characterData.json")
+PROPS_FILE = os.path.join(FRAMEDATA_DIR, "all_chars.csv")
+
+CACHE_FILE = "framedata-cache.json"
+FALLBACK_FILE = "framedata.json"
 
 def parse_frame_data():
   """
   Parses the frame data and returns a mapping from character IDs to mappings
   from stat name to stat value.
   """
-  result = None
-  with open("framedata.json", 'r') as fin:
-    result = json.load(fin)
+  if not os.path.exists(DATA_FILE):
+    with open(FALLBACK_FILE, 'r') as fin:
+      return json.load(fin)
+
+  return cached_frame_data()
+
+def file_hash(filename):
+  """
+  Returns the SHA-256 hex digest of the given file's contents.
+  """
+  digest = hashlib.sha256()
+  with open(filename, 'rb') as fin:
+    for chunk in iter(lambda: fin.read(1 << 20), b""):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+def code_files(filename=PROCESS_FILE):
+  """
+  Returns the given framedata script followed by every module in the
+  framedata directory that it imports (anywhere in the file), directly or
+  through another such module.
+  """
+  files = [filename]
+  for path in files:
+    with open(path, 'r') as fin:
+      tree = ast.parse(fin.read(), path)
+    for node in ast.walk(tree):
+      if isinstance(node, ast.Import):
+        names = [alias.name for alias in node.names]
+      elif isinstance(node, ast.ImportFrom) and node.level == 0:
+        names = [node.module]
+      else:
+        continue
+      for name in names:
+        module = os.path.join(FRAMEDATA_DIR, name.split('.')[0] + ".py")
+        if os.path.exists(module) and module not in files:
+          files.append(module)
+  return files
+
+def load_process():
+  """
+  Imports ../framedata/process.py (which isn't on the module path) and
+  points its file names at the framedata directory. The framedata directory
+  is added to the module path so that process.py's own imports of its
+  sibling modules work.
+  """
+  if FRAMEDATA_DIR not in sys.path:
+    sys.path.append(FRAMEDATA_DIR)
+  spec = importlib.util.spec_from_file_location(
+    "framedata_process",
+    PROCESS_FILE
+  )
+  process = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(process)
+  process.CPFILE = PROPS_FILE
+  process.EXTRACT_DIR = os.path.join(FRAMEDATA_DIR, process.EXTRACT_DIR)
+  return process
+
+def character_hash(process, ch, data):
+  """
+  Hashes the inputs for a single character: their characterData.json
+  entries and their all_chars.csv row.
+  """
+  digest = hashlib.sha256()
+  for cid in process.variant_ids(ch):
+    digest.update(json.dumps(data[cid], sort_keys=True).encode("utf-8"))
+  digest.update(json.dumps(process.CPROPS[ch], sort_keys=True).encode("utf-8"))
+  return digest.hexdigest()
+
+def cached_frame_data():
+  """
+  Returns frame data from CACHE_FILE, first bringing it up to date with the
+  files it's derived from if any of them have changed.
+  """
+  code = code_files()
+  inputs = {
+    os.path.basename(f): file_hash(f)
+      for f in [DATA_FILE, PROPS_FILE] + code
+  }
+
+  cache = { "inputs": None, "characters": {} }
+  if os.path.exists(CACHE_FILE):
+    with open(CACHE_FILE, 'r') as fin:
+      cache = json.load(fin)
+
+  if cache["inputs"] == inputs:
+    return { ch: entry["stats"] for ch, entry in cache["characters"].items() }
+
+  # process.py's progress messages would end up in our output otherwise
+  with contextlib.redirect_stdout(sys.stderr):
+    process = load_process()
+    process.define_cprops()
+    data = process.load_characters(process.roster_ids(), filename=DATA_FILE)
+
+    # Any change to process.py or its modules could affect every character
+    code_changed = (
+      cache["inputs"] == None
+   or any(
+        cache["inputs"].get(os.path.basename(f)) != inputs[os.path.basename(f)]
+          for f in code
+      )
+    )
+    hashes = { ch: character_hash(process, ch, data) for ch in process.idmap }
+    stale = [
+      ch for ch in process.idmap
+        if code_changed
+        or ch not in cache["characters"]
+        or cache["characters"][ch]["hash"] != hashes[ch]
+    ]
+    print(
+      "Re-analyzing {} of {} characters...".format(
+        len(stale),
+        len(process.idmap)
+      )
+    )
+    fresh, _ = process.character_stats(stale, data, workers=1)
+
+  characters = {}
+  for ch in process.idmap:
+    if ch in fresh:
+      stats = fresh[ch]
+    else:
+      stats = cache["characters"][ch]["stats"]
+    characters[ch] = { "hash": hashes[ch], "stats": stats }
+
+  with open(CACHE_FILE, 'w') as fout:
+    json.dump({ "inputs": inputs, "characters": characters }, fout)
 
-  return result
+  return { ch: entry["stats"] for ch, entry in characters.items() }
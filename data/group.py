@@ -9,11 +9,16 @@ import properties
 import framedata
 
 def process(source):
-  ingame_stats = framedata.parse_frame_data()
-
   reader = csv.DictReader(source, dialect="excel-tab")
-
-  rows = [rin for rin in reader]
+  return process_rows([rin for rin in reader])
+
+def process_rows(rows):
+  """
+  Groups the fields of rows from reprocess.py (dictionaries of strings, as
+  read from efr-aug.tsv) into records, returning the data for
+  efr-aug-grp.json.
+  """
+  ingame_stats = framedata.parse_frame_data()
 
   aliases = properties.construct_aliases()
 
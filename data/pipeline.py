@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+
+Runs the whole analysis (process.py, reprocess.py, group.py, analyze.py,
+correct.py and tabulate.py) in a single interpreter, handing each stage's
+output to the next in memory instead of through efr.tsv, efr-aug.tsv,
+efr-aug-grp.json, tests-N.json and analysis_results-N.json. Prints the
+LaTeX tables (what tables-N.tex holds) to stdout.
+
+Usage:
+
+  ./pipeline.py [--trials N] [--reject FILE] [--keep] BATCH...
+  ./pipeline.py [--trials N] [--keep] --efr efr.tsv
+
+The batch files are filtered against the "--reject" list as in process.py.
+Given "--efr", starts from an existing efr.tsv instead of the batch files.
+With "--keep", the intermediate files are written out as well, under the
+names the Makefile uses (along with initial-report-N.txt and
+corrections-report-N.txt), so later make targets can pick up from them;
+otherwise the stages' progress reports go to stderr.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import sys
+
+import analyze
+import clean
+import correct
+import group
+import process
+import reprocess
+import tabulate
+
+def as_records(table):
+  """
+  Turns a table whose first row is the header into a list of dictionaries
+  of strings, the same as writing it out as TSV and reading it back in with
+  csv.DictReader.
+  """
+  header = table[0]
+  return [
+    dict(zip(header, (str(x) if x != None else "" for x in row)))
+      for row in table[1:]
+  ]
+
+def write_table(table, filename, write):
+  with open(filename, 'w') as fout:
+    write(table, fout)
+
+def read_efr(filename):
+  with open(filename, 'r') as fin:
+    return list(csv.DictReader(fin, dialect="excel-tab"))
+
+def run(sources, n_trials=100, rejects=None, keep=False, efr_file=None):
+  """
+  Runs every stage on the given batch files (or from the given efr.tsv
+  file), returning (effects, expected) as written to
+  analysis_results-N.json. If keep is True, writes each stage's output file
+  along the way.
+  """
+  if efr_file != None:
+    efr = read_efr(efr_file)
+  else:
+    table = process.process(sources, rejects)
+    if keep:
+      write_table(table, "efr.tsv", process.output)
+    efr = as_records(table)
+
+  aug = reprocess.process_rows(efr)
+  if keep:
+    write_table(aug, "efr-aug.tsv", reprocess.output)
+
+  grouped = group.process_rows(as_records(aug))
+  if keep:
+    write_table(grouped, "efr-aug-grp.json", group.output)
+
+  report = open("initial-report-{}.txt".format(n_trials), 'w') if keep \
+    else contextlib.nullcontext(sys.stderr)
+  with report as fout, contextlib.redirect_stdout(fout):
+    print('='*80)
+    tests = analyze.run_tests(grouped, n_trials)
+    print('-'*80)
+    print("...testing complete.")
+    print('='*80)
+  if keep:
+    with open("tests-{}.json".format(n_trials), 'w') as fout:
+      json.dump(tests, fout)
+
+  report = open("corrections-report-{}.txt".format(n_trials), 'w') if keep \
+    else contextlib.nullcontext(sys.stderr)
+  with report as fout, contextlib.redirect_stdout(fout):
+    effects, expected = correct.correct(tests)
+    if keep:
+      with open("analysis_results-{}.json".format(n_trials), 'w') as fout:
+        json.dump([effects, expected], fout)
+    correct.summarize(effects, expected, tests["rows"])
+
+  return effects, expected
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Runs the analysis from batch files to LaTeX tables."
+  )
+  parser.add_argument("sources", nargs='*', metavar="BATCH")
+  parser.add_argument("--efr", metavar="FILE")
+  parser.add_argument("--trials", type=int, default=100)
+  parser.add_argument("--reject", metavar="FILE")
+  parser.add_argument("--keep", action="store_true")
+  args = parser.parse_args()
+
+  if not args.sources and not args.efr:
+    parser.error("either batch files or --efr is required")
+
+  rejects = None
+  if args.reject:
+    rejects = clean.read_rejects(args.reject)
+
+  effects, expected = run(
+    args.sources,
+    args.trials,
+    rejects,
+    args.keep,
+    args.efr
+  )
+  tabulate.show_tables(effects, expected)
+
+if __name__ == "__main__":
+  main()
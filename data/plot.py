@@ -1,14 +1,39 @@
 #!/usr/bin/env python3
+"""
+plot.py
 
-import sys
+Plots the figures in plots/ from efr-aug-grp.json (read from stdin). Each
+figure is drawn in its own worker process (see figure_jobs and
+render_figure) using the Agg backend and matplotlib's object-oriented API,
+and saved in every format in FORMATS at once, printing the name of each
+file written.
+
+Usage:
+
+  ./plot.py [-j WORKERS] [--formats svg,pdf,png] < efr-aug-grp.json
+"""
+
+import argparse
+import collections
+import functools
 import json
+import multiprocessing
+import sys
 
 import matplotlib
-import matplotlib.pyplot as plt
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
 import numpy as np
 
 from analyze import get
 
+PLOTS_DIR = "plots"
+
+FORMATS = ["svg", "pdf", "png"]
+
+# Resolution for raster formats
+DPI = 200
+
 gender_colors = [
   "#9900bb",
   "#ffbb00",
@@ -58,53 +83,137 @@ font = {
   "stretch": "condensed",
   "size": 15,
 }
-matplotlib.rc('font', **font)
+
+# Larger for the demographics figures
+demographics_font = dict(font, size=19)
 
 default_colors = gender_colors
 
+# Median construct values are counted at each point on this scale
+scale = [i/2 for i in range(2,15)]
+
+class ConstructBins:
+  """
+  Bins the median construct values of a list of rows by group, construct
+  and scale point. Groupings are analyze.get indices (like
+  ".character.gendergroup"); each grouping and list of constructs is binned
+  once, in a single vectorized pass over the distinct values, and cached.
+  The plotting functions take the (picklable) results of binned, so this
+  only needs to exist in the process that reads the rows.
+  """
+  def __init__(self, rows, scale=scale):
+    self.rows = rows
+    self.scale = np.array(scale, dtype=float)
+    # Scale point b counts values in [b - 0.25, b + 0.25)
+    self.edges = np.append(self.scale - 0.25, self.scale[-1] + 0.25)
+    self.columns = {}
+    self.groupings = {}
+    self.cache = {}
+
+  def values(self, constructs):
+    """
+    Returns an array of median values with a row per row and a column per
+    construct.
+    """
+    for c in constructs:
+      if c not in self.columns:
+        self.columns[c] = np.array(
+          [get(r, ".med_constructs:{}".format(c)) for r in self.rows],
+          dtype=float
+        )
+    return np.stack([self.columns[c] for c in constructs], axis=1)
+
+  def groups(self, group_by):
+    """
+    Returns the groups under the given grouping (in order of appearance) and
+    an array of each row's group number.
+    """
+    if group_by not in self.groupings:
+      labels = [get(r, group_by) for r in self.rows]
+      groups = list(dict.fromkeys(labels))
+      number = { g: i for i, g in enumerate(groups) }
+      self.groupings[group_by] = (
+        groups,
+        np.array([number[l] for l in labels], dtype=int)
+      )
+    return self.groupings[group_by]
+
+  def binned(self, group_by, constructs):
+    """
+    Returns a dictionary describing the values of the given constructs for
+    each group under the given grouping. "groups" lists the groups,
+    "constructs" the constructs and "scale" the scale points, and the other
+    entries are arrays indexed by group number, construct number and (for
+    "counts" and "widths") scale point:
+
+      - "counts": how many values are in each scale point's bin
+      - "widths": how many values are within 0.1 of each scale point, plus
+        half how many are within 0.25
+      - "mins" and "maxes": the smallest and largest values
+    """
+    key = (group_by, tuple(constructs))
+    if key in self.cache:
+      return self.cache[key]
+
+    groups, numbers = self.groups(group_by)
+    values = self.values(constructs)
+    ng, nc = len(groups), len(constructs)
+
+    # Tally each distinct value per group and construct
+    distinct, which = np.unique(values, return_inverse=True)
+    nd = len(distinct)
+    cells = numbers[:, None] * nc + np.arange(nc)[None, :]
+    tally = np.bincount(
+      (cells * nd + which.reshape(values.shape)).ravel(),
+      minlength=ng * nc * nd
+    ).reshape(ng, nc, nd)
+
+    # Which bin (if any) each distinct value falls in
+    bin_of = np.searchsorted(self.edges, distinct, side="right") - 1
+    in_bin = bin_of[:, None] == np.arange(len(self.scale))[None, :]
+
+    distance = np.abs(distinct[:, None] - self.scale[None, :])
+    weight = (distance < 0.1) + 0.5 * (distance <= 0.25)
+
+    present = tally > 0
+    self.cache[key] = {
+      "groups": groups,
+      "constructs": list(constructs),
+      "scale": self.scale.tolist(),
+      "counts": tally @ in_bin.astype(int),
+      "widths": tally @ weight,
+      "mins": distinct[np.argmax(present, axis=2)],
+      "maxes": distinct[nd - 1 - np.argmax(present[:, :, ::-1], axis=2)],
+    }
+    return self.cache[key]
+
 def plot_construct_by_group(
-  crows,
-  construct,
-  group_def,
+  binned,
   group_arrange=None,
   style={}
 ):
   """
-  Plots median sexualization by gender.
+  Plots median sexualization by gender, returning the figure. Takes the
+  ConstructBins.binned results for a single construct.
   """
-  scale = [i/2 for i in range(2,15)]
-
-  groups = set([group_def(r) for r in crows])
+  scale = binned["scale"]
+  groups = binned["groups"]
 
   if group_arrange == None:
     group_arrange = [ (g, g) for g in groups ]
 
-  values = {
-    g: [
-      get(r, ".med_constructs:{}".format(construct))
-        for r in crows
-        if group_def(r) == g
-    ]
-      for g in groups
-  }
-
-  bins = {
-    g: [
-      len([x for x in values[g] if x >= b - 0.25 and x < b + 0.25])
-        for b in scale
-    ]
-      for g in groups
-  }
-  max_count = max([max(bins[g]) for g in groups])
+  counts = { g: binned["counts"][i, 0] for i, g in enumerate(groups) }
+  max_count = int(binned["counts"].max())
   max_bins = [ max_count ]*len(scale)
 
 
-  fig, ax = plt.subplots()
+  fig = Figure()
+  ax = fig.subplots()
   index = np.arange(len(scale))
   ng = len(groups)
   bar_height = 1/ng
 
-  orects = plt.barh(
+  orects = ax.barh(
     index,
     [x+1 for x in max_bins],
     1.0,
@@ -113,9 +222,9 @@ def plot_construct_by_group(
     ec="gray"
   )
   rects = [
-    plt.barh(
+    ax.barh(
       index + (bar_height*i - bar_height*(ng//2)),
-      bins[g],
+      counts[g],
       bar_height,
       color=style.get("colors", default_colors)[i],
       label=alias
@@ -123,60 +232,48 @@ def plot_construct_by_group(
     for (i, (g, alias)) in enumerate(group_arrange)
   ]
 
-  plt.xlabel("Number of Characters")
-  plt.ylabel(style.get("ylabel", "Median Value"))
+  ax.set_xlabel("Number of Characters")
+  ax.set_ylabel(style.get("ylabel", "Median Value"))
   if "title" in style:
-    plt.title(style["title"], pad=45)
-  plt.yticks(index, [int(s) if int(s) == s else s for s in scale])
-  plt.xticks(range(max_count+1),range(max_count+1))
-  plt.xlim(0, max_count+0.5)
-  plt.legend(
+    ax.set_title(style["title"], pad=45)
+  ax.set_yticks(index)
+  ax.set_yticklabels([int(s) if int(s) == s else s for s in scale])
+  ax.set_xticks(range(max_count+1))
+  ax.set_xticklabels(range(max_count+1))
+  ax.set_xlim(0, max_count+0.5)
+  ax.legend(
     loc=style.get("lpos", "lower left"),
     bbox_to_anchor=(0, 1.01),
     ncol=len(group_arrange),
     fontsize=14
   )
 
-  plt.tight_layout()
+  fig.tight_layout()
+  return fig
 
 def plot_ranges_by_group(
-  crows,
-  constructs,
-  group_def,
+  binned,
   group_arrange=None,
   style={}
 ):
   """
-  Plots ranges for multiple constructs separated by groups.
+  Plots ranges for multiple constructs separated by groups, returning the
+  figure. Takes ConstructBins.binned results.
   """
-  scale = [i/2 for i in range(2,15)]
-
-  groups = set([group_def(r) for r in crows])
+  scale = binned["scale"]
+  constructs = binned["constructs"]
+  groups = binned["groups"]
 
   if group_arrange == None:
     group_arrange = [ (g, g) for g in groups ]
 
-  values = {
-    g: [
-      [
-        get(r, ".med_constructs:{}".format(c))
-          for r in crows
-          if group_def(r) == g
-      ]
-        for c in constructs
-    ]
-      for g in groups
-  }
-
   ranges = {
-    g: [
-      (min(cvs), max(cvs))
-      for cvs in values[g]
-    ]
-      for g in groups
+    g: list(zip(binned["mins"][i], binned["maxes"][i]))
+      for i, g in enumerate(groups)
   }
 
-  fig, ax = plt.subplots()
+  fig = Figure()
+  ax = fig.subplots()
   index = np.arange(len(constructs))
   ng = len(group_arrange)
   bar_width = 1/ng
@@ -185,7 +282,7 @@ def plot_ranges_by_group(
   min_height = 0.07
 
   rects = [
-    plt.bar(
+    ax.bar(
       index - 0.5 + bar_width*(i+1),
       [
         rng[1] - rng[0] if rng[1] > rng[0] else min_height
@@ -202,83 +299,52 @@ def plot_ranges_by_group(
     for (i, (g, alias)) in enumerate(group_arrange)
   ]
 
-  plt.xlabel("Construct")
-  plt.ylabel(style.get("ylabel", "Median Value"))
+  ax.set_xlabel("Construct")
+  ax.set_ylabel(style.get("ylabel", "Median Value"))
   if "title" in style:
-    plt.title(style["title"], pad=45)
-  plt.yticks(
-    scale,
-    [int(s) if int(s) == s else s for s in scale]
-  )
-  plt.xticks(index, style.get("clabels", index), fontsize=14, rotation=90)
-  plt.xlim(index[0] - 0.5 - sep, index[-1] + 0.5 + sep)
-  plt.legend(
+    ax.set_title(style["title"], pad=45)
+  ax.set_yticks(scale)
+  ax.set_yticklabels([int(s) if int(s) == s else s for s in scale])
+  ax.set_xticks(index)
+  ax.set_xticklabels(style.get("clabels", index), fontsize=14, rotation=90)
+  ax.set_xlim(index[0] - 0.5 - sep, index[-1] + 0.5 + sep)
+  ax.legend(
     loc=style.get("lpos", "lower left"),
     bbox_to_anchor=(0, 1.01),
     ncol=len(group_arrange),
     fontsize=14
   )
 
-  plt.tight_layout()
+  fig.tight_layout()
+  return fig
 
 def plot_histograms_by_group(
-  crows,
-  constructs,
-  group_def,
+  binned,
   group_arrange=None,
   style={}
 ):
   """
-  Plots histograms for multiple constructs separated by groups.
+  Plots histograms for multiple constructs separated by groups, returning
+  the figure. Takes ConstructBins.binned results.
   """
-  scale = [i/2 for i in range(2,15)]
-
-  groups = set([group_def(r) for r in crows])
+  scale = binned["scale"]
+  constructs = binned["constructs"]
+  groups = binned["groups"]
 
   if group_arrange == None:
     group_arrange = [ (g, g) for g in groups ]
 
-  values = {
-    g: [
-      [
-        get(r, ".med_constructs:{}".format(c))
-          for r in crows
-          if group_def(r) == g
-      ]
-        for c in constructs
-    ]
-      for g in groups
-  }
-
   ranges = {
-    g: [
-      (min(cvs), max(cvs))
-      for cvs in values[g]
-    ]
-      for g in groups
+    g: list(zip(binned["mins"][i], binned["maxes"][i]))
+      for i, g in enumerate(groups)
   }
 
-  widths = {
-    g: [
-      [
-        len([val for val in cvs if abs(val - value) < 0.1])
-      + 0.5 * len([val for val in cvs if abs(val - value) <= 0.25])
-        for value in scale
-      ]
-        for cvs in values[g]
-    ]
-      for g in groups
-  }
+  widths = { g: binned["widths"][i] for i, g in enumerate(groups) }
 
-  maxwidth = max(
-    max(
-      max(bincounts)
-      for bincounts in widths[g]
-    )
-    for g in groups
-  )
+  maxwidth = binned["widths"].max()
 
-  fig, ax = plt.subplots()
+  fig = Figure()
+  ax = fig.subplots()
   index = np.arange(len(constructs)) - 0.5
   ng = len(group_arrange)
   group_width = 1/ng
@@ -288,7 +354,7 @@ def plot_histograms_by_group(
   index = index * (1 + sep)
   min_height = 0.07
 
-  boxes = plt.bar(
+  boxes = ax.bar(
     index + (0.5 * (1 + sep)), # x-positions
     scale[-1] + 1.5, # bar heights
     1 + sep, # bar width
@@ -298,7 +364,7 @@ def plot_histograms_by_group(
   )
 
   rects = [
-    plt.barh(
+    ax.barh(
       scale, # bar y-positions
       [ width_unit * (cv / maxwidth) for cv in construct_values ], # bar widths
       0.46, # bar height
@@ -314,30 +380,31 @@ def plot_histograms_by_group(
     for (j, construct_values) in enumerate(widths[g])
   ]
 
-  plt.xlabel("Construct")
-  plt.ylabel(style.get("ylabel", "Median Value"))
+  ax.set_xlabel("Construct")
+  ax.set_ylabel(style.get("ylabel", "Median Value"))
   if "title" in style:
-    plt.title(style["title"], pad=45)
-  plt.yticks(
-    scale,
+    ax.set_title(style["title"], pad=45)
+  ax.set_yticks(scale)
+  ax.set_yticklabels(
     [int(s) if int(s) == s else s for s in scale],
     fontsize=14
   )
-  plt.ylim(scale[0] - 0.5, scale[-1] + 0.5)
-  plt.xticks(
-    index + 0.5*(1+sep),
+  ax.set_ylim(scale[0] - 0.5, scale[-1] + 0.5)
+  ax.set_xticks(index + 0.5*(1+sep))
+  ax.set_xticklabels(
     style.get("clabels", index),
     fontsize=11,
   )
-  plt.xlim(index[0], index[-1] + 1 + sep)
-  plt.legend(
+  ax.set_xlim(index[0], index[-1] + 1 + sep)
+  ax.legend(
     loc=style.get("lpos", "lower left"),
     bbox_to_anchor=(0, 1.01),
     ncol=len(group_arrange),
     fontsize=14
   )
 
-  plt.tight_layout()
+  fig.tight_layout()
+  return fig
 
 language_misspellings = {
   "Englsih": [ "English" ],
@@ -466,106 +533,263 @@ def label_bars(ax, rects, labels, vert=False):
         )
 
 
-def plot_demographics(prows, style={}):
+demographic_properties = [
+  ("age", "Age", ".participant.age"),
+  ("edu", "Education", ".participant.education"),
+  ("play", "Play Frequency", ".participant.play_frequency"),
+  ("gender", "Gender", ".participant.normalized_gender"),
+  #("Ethnicity", ".participant.normalized_ethnicity"),
+  #("Nationality", ".participant.normalized_nationality"),
+]
+
+# TODO: plot these too
+compound_demographic_properties = [
+  (
+    "played",
+    "Games Played",
+    [
+      (".participant.played_specific", { "no" }),
+      (".participant.played_franchise", { "no" }), 
+      (".participant.played_fighting", { "no" }),
+      (".participant.played_any", None), 
+    ]
+  ),
+  (
+    "watched",
+    "Games Watched",
+    [
+      (".participant.watched_franchise", { "no" }),
+      (".participant.watched_fighting", None),
+    ]
+  ),
+]
+
+def answer_counts(prows, pr):
+  """
+  Counts how many of the given participants gave each answer to one
+  demographic property.
+  """
+  # Multiple-choice answers are dictionaries keyed by the chosen values
+  answers = [get(r, pr) for r in prows]
+  counts = collections.Counter()
+  if isinstance(answers[0], dict):
+    for answer in answers:
+      counts.update(answer.keys())
+  else:
+    counts.update(answers)
+  return counts
+
+def plot_demographic(counts, name, style={}):
+  """
+  Plots the distribution of one demographic property (given its
+  answer_counts), returning the figure.
+  """
+  fig = Figure()
+  ax = fig.subplots()
+  values = sorted(counts)
+  order = (
+    value_orderings[name]
+      if name in value_orderings
+      else [(v, v) for v in values]
+  )
+  hist = [counts[v] for (v, d) in order]
+
+  index = np.arange(len(values))
+  bar_height = 0.8
+  rects = ax.barh(
+    index,
+    hist,
+    bar_height,
+    color=style.get("color", default_colors[0]),
+    label=name
+  )
+  label_bars(ax, rects, hist, vert=False)
+  ax.set_title(name, fontsize=24, pad=8)
+  ax.set_yticks(index)
+  ax.set_yticklabels([d for (v, d) in order])
+  ax.get_xaxis().set_visible(False)
+  fig.patch.set_visible(False)
+  fig.tight_layout()
+  return fig
+
+def figure_jobs(crows, prows):
   """
-  Plots demographic information all at once.
+  Returns a list of (name, font, plot function, arguments, keyword
+  arguments) tuples, one per figure, where crows has one row per character
+  and prows one row per participant. The rows are binned or counted here,
+  so the jobs only carry what each figure plots, and figures that share a
+  grouping and constructs share their binning.
   """
-  # Configure font size
-  font = {
-    "family": "DejaVu Sans",
-    "stretch": "condensed",
-    "size": 19,
-  }
-  matplotlib.rc('font', **font)
-
-  simple_properties = [
-    ("age", "Age", ".participant.age"),
-    ("edu", "Education", ".participant.education"),
-    ("play", "Play Frequency", ".participant.play_frequency"),
-    ("gender", "Gender", ".participant.normalized_gender"),
-    #("Ethnicity", ".participant.normalized_ethnicity"),
-    #("Nationality", ".participant.normalized_nationality"),
+  bins = ConstructBins(crows)
+  gender_arrange = [
+    ["men", "Men"],
+    ["women", "Women"],
+    ["ambiguous", "Ambiguous"],
   ]
-  compound_properties = [
+  construct_labels = [
+    "musculature",
+    "thinness",
+    "youth",
+    "attractive-\nness",
+    "sexualization",
+    "attire\nsexualization"
+  ]
+  jobs = [
     (
-      "played",
-      "Games Played",
-      [
-        (".participant.played_specific", { "no" }),
-        (".participant.played_franchise", { "no" }), 
-        (".participant.played_fighting", { "no" }),
-        (".participant.played_any", None), 
-      ]
+      "sexualization_by_gender",
+      font,
+      plot_construct_by_group,
+      (bins.binned(".character.gendergroup", [2]),),
+      {
+        "group_arrange": gender_arrange,
+        "style": {
+          "title": "Sexualization by Gender",
+          "ylabel": "Median Sexualization Construct",
+          "colors": gender_colors,
+        },
+      }
     ),
     (
-      "watched",
-      "Games Watched",
-      [
-        (".participant.watched_franchise", { "no" }),
-        (".participant.watched_fighting", None),
-      ]
+      "constructs_by_gender",
+      font,
+      plot_histograms_by_group,
+      (bins.binned(".character.gendergroup", [3, 4, 1, 0, 2, 8]),),
+      {
+        "group_arrange": gender_arrange,
+        "style": {
+          "clabels": construct_labels,
+          "title": "Construct Ranges by Gender",
+          "ylabel": "Median Construct Values",
+          "xlabel": "Construct (width shows # of characters)",
+          "colors": gender_colors,
+        },
+      }
+    ),
+    (
+      "constructs_by_skin_color",
+      font,
+      plot_histograms_by_group,
+      (bins.binned(".character.skin_tone", [3, 4, 1, 0, 2, 8]),),
+      {
+        "group_arrange": [
+          ["lighter", "Lighter"],
+          ["darker", "Darker"],
+          ["indeterminate", "Indeterminate"],
+        ],
+        "style": {
+          "clabels": construct_labels,
+          "title": "Construct Ranges by Skin Color",
+          "ylabel": "Median Construct Values",
+          "xlabel": "Construct (width shows # of characters)",
+          "colors": tone_colors,
+        },
+      }
+    ),
+    # Note: This is way too messy to be useful...
+    (
+      "musculature_by_nationality",
+      font,
+      plot_histograms_by_group,
+      (bins.binned(".character.country", [3]),), # musculature
+      {
+        "group_arrange": [
+          ["Japan", "Japan"],
+          ["United States of America", "United States of America"],
+          ["Brazil", "Brazil"],
+          ["China", "China"],
+          ["Russia", "Russia"],
+          ["United Kingdom", "United Kingdom"],
+          ["Canada", "Canada"],
+          ["Egypt", "Egypt"],
+          ["Germany", "Germany"],
+          ["India", "India"],
+          ["Ireland", "Ireland"],
+          ["Italy", "Italy"],
+          ["Mexico", "Mexico"],
+          ["Middle East", "Middle East"],
+          ["Monaco", "Monaco"],
+          ["Philippines", "Philippines"],
+          ["Saudi Arabia", "Saudi Arabia"],
+          ["South Korea", "South Korea"],
+          ["Spain", "Spain"],
+          ["Sweden", "Sweden"],
+          ["Unknown", "Unknown"],
+        ],
+        "style": {
+          "clabels": [
+            "musculature",
+          ],
+          "title": "Musculature by Nationality",
+          "ylabel": "Median Construct Values",
+          "xlabel": "Construct (width shows # of characters)",
+          "colors": nationality_colors,
+        },
+      }
     ),
   ]
 
-  for i, (tag, name, pr) in enumerate(simple_properties):
-    fig, ax = plt.subplots()
-    if isinstance(get(prows[0], pr), dict):
-      values = set()
-      for r in prows:
-        values |= set(get(r, pr).keys())
-      values = sorted(list(values))
-      order = (
-        value_orderings[name]
-          if name in value_orderings
-          else [(v, v) for v in values]
-      )
-      hist = [
-        len([r for r in prows if v in get(r, pr)])
-          for (v, d) in order
-      ]
-    else:
-      values = sorted(list(set(get(r, pr) for r in prows)))
-      order = (
-        value_orderings[name]
-          if name in value_orderings
-          else [(v, v) for v in values]
+  for i, (tag, name, pr) in enumerate(demographic_properties):
+    jobs.append(
+      (
+        "demo-" + tag,
+        demographics_font,
+        plot_demographic,
+        (answer_counts(prows, pr), name),
+        { "style": { "color": demographics_colors[i] } }
       )
-      hist = [
-        len([r for r in prows if get(r, pr) == v])
-          for (v, d) in order
-      ]
-
-    index = np.arange(len(values))
-    bar_height = 0.8
-    rects = ax.barh(
-      index,
-      hist,
-      bar_height,
-      color=style.get("colors", default_colors)[i],
-      label=name
     )
-    label_bars(ax, rects, hist, vert=False)
-    ax.set_title(name, fontsize=24, pad=8)
-    ax.set_yticks(index)
-    ax.set_yticklabels([d for (v, d) in order])
-    ax.get_xaxis().set_visible(False)
-    fig.patch.set_visible(False)
-    plt.tight_layout()
-
-    filename = f"plots/demo-{tag}.svg"
-    print(f"Saving '{filename}'...")
-    plt.savefig(filename, format="svg")
-    plt.close()
-
-  for tag, name, fallbacks in compound_properties:
-    pass
-    # TODO
-
-def main(fin):
+
+  return jobs
+
+def render_figure(job, formats=FORMATS):
+  """
+  Draws the figure for a job from figure_jobs and saves it in each of the
+  given formats, returning the filenames written.
+  """
+  name, job_font, plot, args, kwargs = job
+  with matplotlib.rc_context({"font." + k: v for k, v in job_font.items()}):
+    fig = plot(*args, **kwargs)
+    filenames = []
+    for fmt in formats:
+      filename = "{}/{}.{}".format(PLOTS_DIR, name, fmt)
+      fig.savefig(filename, format=fmt, dpi=DPI)
+      filenames.append(filename)
+  return filenames
+
+def render_figures(jobs, formats=FORMATS, workers=None):
+  """
+  Renders the given jobs (in parallel with the given number of worker
+  processes, or one per core if None), returning the filenames written by
+  each.
+  """
+  render = functools.partial(render_figure, formats=formats)
+  if workers == 1:
+    return [render(job) for job in jobs]
+  with multiprocessing.Pool(workers) as pool:
+    return pool.map(render, jobs)
+
+def main():
   """
   Analyze the data from stdin.
   """
-  data = json.loads(fin.read())
+  parser = argparse.ArgumentParser(
+    description="Plots figures from grouped data read from stdin."
+  )
+  parser.add_argument(
+    "-j",
+    "--workers",
+    type=int,
+    default=None,
+    help="number of worker processes (default: one per core)"
+  )
+  parser.add_argument(
+    "--formats",
+    default=','.join(FORMATS),
+    help="comma-separated output formats (default: %(default)s)"
+  )
+  args = parser.parse_args()
+
+  data = json.loads(sys.stdin.read())
   records = data["records"]
   fields = data["fields"]
   rows = []
@@ -589,132 +813,11 @@ def main(fin):
       seen.add(pid)
       prows.append(r)
 
-  plot_construct_by_group(
-    crows,
-    2,
-    lambda r: get(r, ".character.gendergroup"),
-    group_arrange=[
-      ["men", "Men"],
-      ["women", "Women"],
-      ["ambiguous", "Ambiguous"],
-    ],
-    style={
-      "title": "Sexualization by Gender",
-      "ylabel": "Median Sexualization Construct",
-      "colors": gender_colors,
-    }
-  )
-
-  filename = "plots/sexualization_by_gender.svg"
-  print(f"Saving '{filename}'...")
-  plt.savefig(filename, format="svg")
-  plt.close()
-
-  plot_histograms_by_group(
-    crows,
-    [3, 4, 1, 0, 2, 8],
-    lambda r: get(r, ".character.gendergroup"),
-    group_arrange=[
-      ["men", "Men"],
-      ["women", "Women"],
-      ["ambiguous", "Ambiguous"],
-    ],
-    style={
-      "clabels": [
-        "musculature",
-        "thinness",
-        "youth",
-        "attractive-\nness",
-        "sexualization",
-        "attire\nsexualization"
-      ],
-      "title": "Construct Ranges by Gender",
-      "ylabel": "Median Construct Values",
-      "xlabel": "Construct (width shows # of characters)",
-      "colors": gender_colors,
-    }
-  )
-  filename = "plots/constructs_by_gender.svg"
-  print(f"Saving '{filename}'...")
-  plt.savefig(filename, format="svg")
-  plt.close()
-
-  plot_histograms_by_group(
-    crows,
-    [3, 4, 1, 0, 2, 8],
-    lambda r: get(r, ".character.skin_tone"),
-    group_arrange=[
-      ["lighter", "Lighter"],
-      ["darker", "Darker"],
-      ["indeterminate", "Indeterminate"],
-    ],
-    style={
-      "clabels": [
-        "musculature",
-        "thinness",
-        "youth",
-        "attractive-\nness",
-        "sexualization",
-        "attire\nsexualization"
-      ],
-      "title": "Construct Ranges by Skin Color",
-      "ylabel": "Median Construct Values",
-      "xlabel": "Construct (width shows # of characters)",
-      "colors": tone_colors,
-    }
-  )
-
-  filename = "plots/constructs_by_skin_color.svg"
-  print(f"Saving '{filename}'...")
-  plt.savefig(filename, format="svg")
-  plt.close()
-
-  # Note: This is way too messy to be useful...
-  plot_histograms_by_group(
-    crows,
-    [3], # musculature
-    lambda r: get(r, ".character.country"),
-    group_arrange=[
-      ["Japan", "Japan"],
-      ["United States of America", "United States of America"],
-      ["Brazil", "Brazil"],
-      ["China", "China"],
-      ["Russia", "Russia"],
-      ["United Kingdom", "United Kingdom"],
-      ["Canada", "Canada"],
-      ["Egypt", "Egypt"],
-      ["Germany", "Germany"],
-      ["India", "India"],
-      ["Ireland", "Ireland"],
-      ["Italy", "Italy"],
-      ["Mexico", "Mexico"],
-      ["Middle East", "Middle East"],
-      ["Monaco", "Monaco"],
-      ["Philippines", "Philippines"],
-      ["Saudi Arabia", "Saudi Arabia"],
-      ["South Korea", "South Korea"],
-      ["Spain", "Spain"],
-      ["Sweden", "Sweden"],
-      ["Unknown", "Unknown"],
-    ],
-    style={
-      "clabels": [
-        "musculature",
-      ],
-      "title": "Musculature by Nationality",
-      "ylabel": "Median Construct Values",
-      "xlabel": "Construct (width shows # of characters)",
-      "colors": nationality_colors,
-    }
-  )
-  filename = "plots/musculature_by_nationality.svg"
-  print(f"Saving '{filename}'...")
-  plt.savefig(filename, format="svg")
-  plt.close()
-
-  plot_demographics(prows, {"colors": demographics_colors})
-
-  plt.show()
+  jobs = figure_jobs(crows, prows)
+  formats = args.formats.split(',')
+  for filenames in render_figures(jobs, formats, args.workers):
+    for filename in filenames:
+      print(f"Saved '{filename}'")
 
 if __name__ == "__main__":
-  main(sys.stdin)
+  main()
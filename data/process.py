@@ -3,6 +3,7 @@
 import csv
 import sys
 
+import clean
 import properties
 
 idfields = [
@@ -292,7 +293,24 @@ def cheat_char_prop(cid, prp):
   else:
     return CPROPS[cid][uprp]
 
-def process(sources):
+def read_source(fn, rejects=None):
+  """
+  Yields the rows of a batch file as dictionaries. If a set of rejected
+  workers is given, the file is raw and gets filtered and cleaned on the way
+  in (see clean.py); otherwise it's already been filtered.
+  """
+  if rejects != None:
+    yield from clean.read_clean(fn, rejects)
+    return
+
+  with open(fn, 'r') as fin:
+    if fn.endswith(".tsv"):
+      reader = csv.DictReader(fin, dialect="excel-tab")
+    else:
+      reader = csv.DictReader(fin)
+    yield from reader
+
+def process(sources, rejects=None):
   if PIDS == None:
     define_pids()
 
@@ -312,105 +330,99 @@ def process(sources):
   results.append(rout)
 
   for fn in sources:
-    with open(fn, 'r') as fin:
-      if fn.endswith(".tsv"):
-        reader = csv.DictReader(fin, dialect="excel-tab")
-      else:
-        reader = csv.DictReader(fin)
-
-      for rin in reader:
-        wid = rin["WorkerId"]
-        if wid not in PIDS:
-          raise ValueError("Unknown worker '{}'".format(wid))
-        participant, submissions = PIDS[wid]
-        submissions = int(submissions)
-
-        if submissions > 1:
-          continue # skip potentially tainted data
-
-        for idf in idfields:
-          n = idf[-1]
-          cid = rin[idf]
-          rout.append(participant)
-          rout.append(cid)
-
-          for ch in properties.character_properties:
-            ikey = "Input.{}{}".format(ch,n)
-            if ch in properties.motive_properties:
-              if cid in WHY:
-                motive, motive_desc, gender, origin = WHY[cid]
-                if ch == "motive":
-                  val = motive
-                elif ch == "motive_description":
-                  val = motive_desc
-                else:
-                  raise ValueError("Unexpected motive property '{}'".format(ch))
+    for rin in read_source(fn, rejects):
+      wid = rin["WorkerId"]
+      if wid not in PIDS:
+        raise ValueError("Unknown worker '{}'".format(wid))
+      participant, submissions = PIDS[wid]
+      submissions = int(submissions)
+
+      if submissions > 1:
+        continue # skip potentially tainted data
+
+      for idf in idfields:
+        n = idf[-1]
+        cid = rin[idf]
+        rout.append(participant)
+        rout.append(cid)
+
+        for ch in properties.character_properties:
+          ikey = "Input.{}{}".format(ch,n)
+          if ch in properties.motive_properties:
+            if cid in WHY:
+              motive, motive_desc, gender, origin = WHY[cid]
+              if ch == "motive":
+                val = motive
+              elif ch == "motive_description":
+                val = motive_desc
               else:
-                val = None
-                print(
-                  "Warning: Character '{}' doesn't have motives defined".format(
-                    cid
-                  ),
-                  file=sys.stderr
-                )
-            elif ikey in rin:
-              val = rin[ikey]
-            else:
-              val = cheat_char_prop(cid, ch)
-
-            if ch == "gendergroup" and cid == "leo":
-                val = "ambiguous" # refilter Leo's gender
-
-            rout.append(val)
-
-          for p in properties.participant_properties:
-
-            if p in normalized_properties:
-              # There's no input data for these, but their base property will
-              # output two values
-              continue
-
-            pkey = "Answer.{}".format(p)
-            if pkey in rin:
-              val = rin[pkey]
+                raise ValueError("Unexpected motive property '{}'".format(ch))
             else:
-              val = ""
-
-            orig_val = val
-
-            if val in ("{}", ""):
               val = None
-            elif p in normalize_case:
-              val = val.title()
-
-            rout.append(val)
-
-            if p in normalize_map:
-              nm = normalize_map[p]
-              if val in nm:
-                nval = nm[val]
-              elif Undefined in nm:
-                nval = nm[Undefined]
-              else:
-                nval = "<{}>".format(orig_val)
-              # We output a second column containing the normalized value
-              rout.append(nval)
+              print(
+                "Warning: Character '{}' doesn't have motives defined".format(
+                  cid
+                ),
+                file=sys.stderr
+              )
+          elif ikey in rin:
+            val = rin[ikey]
+          else:
+            val = cheat_char_prop(cid, ch)
+
+          if ch == "gendergroup" and cid == "leo":
+              val = "ambiguous" # refilter Leo's gender
+
+          rout.append(val)
+
+        for p in properties.participant_properties:
+
+          if p in normalized_properties:
+            # There's no input data for these, but their base property will
+            # output two values
+            continue
+
+          pkey = "Answer.{}".format(p)
+          if pkey in rin:
+            val = rin[pkey]
+          else:
+            val = ""
+
+          orig_val = val
+
+          if val in ("{}", ""):
+            val = None
+          elif p in normalize_case:
+            val = val.title()
+
+          rout.append(val)
+
+          if p in normalize_map:
+            nm = normalize_map[p]
+            if val in nm:
+              nval = nm[val]
+            elif Undefined in nm:
+              nval = nm[Undefined]
+            else:
+              nval = "<{}>".format(orig_val)
+            # We output a second column containing the normalized value
+            rout.append(nval)
 
-          for c in properties.ratings + properties.personal_ratings:
-            val = rin["Answer.{}_{}".format(c, n)]
+        for c in properties.ratings + properties.personal_ratings:
+          val = rin["Answer.{}_{}".format(c, n)]
 
-            if val in ("{}", "", ' '):
-              val = None
-            else:
-              try:
-                val = int(val)
-              except:
-                print("Nonintable: {}='{}'".format(c, val), file=sys.stderr)
+          if val in ("{}", "", ' '):
+            val = None
+          else:
+            try:
+              val = int(val)
+            except:
+              print("Nonintable: {}='{}'".format(c, val), file=sys.stderr)
 
-            rout.append(val)
+          rout.append(val)
 
-          rout = []
-          results.append(rout)
+        rout = []
+        results.append(rout)
 
   return results
 
@@ -422,5 +434,11 @@ def output(results, dest=sys.stdout):
     print('\t'.join(pure), end='\n' if not last else '', file=dest)
 
 if __name__ == "__main__":
-  d = process(sys.argv[1:])
+  targets = sys.argv[1:]
+  rejects = None
+  if targets[:1] == ["--reject"]:
+    # Raw batch files, filtered against the given reject list as they're read
+    rejects = clean.read_rejects(targets[1])
+    targets = targets[2:]
+  d = process(targets, rejects)
   output(d, sys.stdout)
@@ -9,9 +9,14 @@ import properties
 
 def process(source):
   reader = csv.DictReader(source, dialect="excel-tab")
-
-  rows = [rin for rin in reader]
-
+  return process_rows([rin for rin in reader])
+
+def process_rows(rows):
+  """
+  Adds construct values and per-character and per-participant medians to
+  rows from process.py (dictionaries of strings, as read from efr.tsv),
+  returning a table whose first row is the header.
+  """
   for rn, row in enumerate(rows):
     for cns in properties.construct_list:
       try:
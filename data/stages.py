@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+stages.py
+
+Builds analysis targets (like tables-100.tex or plots.log) by running the
+stages in STAGES, much as the Makefile does, but deciding what to rerun by
+content instead of timestamps:
+
+  - each stage's input files are hashed, so a stage whose inputs were
+    regenerated with identical contents (or merely touched) is skipped
+  - each stage's code is hashed semantically: the stage's own script, plus
+    only those attributes of sibling modules (like properties.py) that the
+    script actually uses, with functions hashed by their bytecode and the
+    module globals they refer to, so editing an unrelated table in
+    properties.py doesn't invalidate every stage
+
+Hashes from the last successful run of each stage are kept in CACHE_FILE.
+Stages that don't depend on each other run concurrently. A stage whose
+outputs exist but whose inputs can't be made (like efr.tsv without the raw
+batch files) is treated as a source. A dry run only lists the stages that
+are already out of date, not those whose inputs would change.
+
+Usage:
+
+  ./stages.py [-j WORKERS] [--dry-run] [--force] TARGET...
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import hashlib
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import types
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_FILE = ".stages-cache.json"
+
+PILOTS = ["batches/pilot-1.csv", "batches/pilot-2.csv"]
+BATCHES = [
+  "batches/batch-1.csv",
+  "batches/batch-2.csv",
+  "batches/batch-3.csv",
+]
+
+# Each stage runs its command (with the shell, in DATA_DIR) to produce its
+# outputs from its inputs; scripts are the Python files whose code it
+# depends on. "{n}" in a stage stands for the number of bootstrap trials,
+# filled in from the requested target. Inputs starting with "?" are
+# optional.
+STAGES = [
+  {
+    "outputs": ["reject.lst"],
+    "inputs": PILOTS + BATCHES,
+    "scripts": ["find_holy.py"],
+    "command": "./find_holy.py --reject {} {} > reject.lst".format(
+      ' '.join("--pilot " + p for p in PILOTS),
+      ' '.join(BATCHES)
+    ),
+  },
+  {
+    "outputs": ["participants.lst"],
+    "inputs": BATCHES + PILOTS,
+    "scripts": [],
+    "command": (
+      "for f in {}; do grep -v Rejected $f | cut -d'\"' -f32 | tail -n+2; done"
+      " | sort | uniq -c | sort > participants.lst"
+    ).format(' '.join(BATCHES + PILOTS)),
+  },
+  {
+    "outputs": ["pids.tsv"],
+    "inputs": ["participants.lst"],
+    "scripts": [],
+    "command": (
+      "printf 'id\\tsubmissions\\tworker_id\\n' > pids.tsv"
+      " && awk '{ print FNR \"\\t\" $1 \"\\t\" $2; }' < participants.lst"
+      " >> pids.tsv"
+    ),
+  },
+  {
+    "outputs": ["efr.tsv"],
+    "inputs": BATCHES + ["reject.lst", "pids.tsv", "why.tsv", "all_chars.csv"],
+    "scripts": ["process.py"],
+    "command": "./process.py --reject reject.lst {} > efr.tsv".format(
+      ' '.join(BATCHES)
+    ),
+  },
+  {
+    "outputs": ["efr-aug.tsv"],
+    "inputs": ["efr.tsv"],
+    "scripts": ["reprocess.py"],
+    "command": "./reprocess.py < efr.tsv > efr-aug.tsv",
+  },
+  {
+    "outputs": ["efr-aug-grp.json"],
+    "inputs": [
+      "efr-aug.tsv",
+      "?../framedata/characterData.json",
+      "?framedata.json",
+      "../framedata/all_chars.csv",
+      "../framedata/process.py",
+      "../framedata/reference_parsers.py",
+    ],
+    "scripts": ["group.py"],
+    "command": "./group.py < efr-aug.tsv > efr-aug-grp.json",
+  },
+  {
+    "outputs": ["tests-{n}.json", "initial-report-{n}.txt"],
+    "inputs": ["efr-aug-grp.json"],
+    "scripts": ["analyze.py"],
+    "command": "./analyze.py {n} < efr-aug-grp.json > initial-report-{n}.txt",
+  },
+  {
+    "outputs": ["analysis_results-{n}.json", "corrections-report-{n}.txt"],
+    "inputs": ["tests-{n}.json"],
+    "scripts": ["correct.py"],
+    "command": (
+      "./correct.py {n} < tests-{n}.json > corrections-report-{n}.txt"
+    ),
+  },
+  {
+    "outputs": ["tables-{n}.tex"],
+    "inputs": ["analysis_results-{n}.json"],
+    "scripts": ["tabulate.py"],
+    "command": "./tabulate.py < analysis_results-{n}.json > tables-{n}.tex",
+  },
+  {
+    "outputs": ["plots.log"],
+    "inputs": ["efr-aug-grp.json"],
+    "scripts": ["plot.py"],
+    "command": "mkdir -p plots && ./plot.py < efr-aug-grp.json > plots.log",
+  },
+]
+
+def file_hash(filename):
+  digest = hashlib.sha256()
+  with open(filename, 'rb') as fin:
+    for chunk in iter(lambda: fin.read(1 << 20), b""):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+def sibling(name):
+  """
+  Returns the path of the module with the given name in DATA_DIR, or None
+  if it isn't one of ours.
+  """
+  path = os.path.join(DATA_DIR, name + ".py")
+  return path if os.path.exists(path) else None
+
+def used_attributes(filename):
+  """
+  Parses a script, returning a mapping from each sibling module it imports
+  to the set of that module's attributes it uses (by "module.name" or
+  "from module import name").
+  """
+  with open(filename, 'r') as fin:
+    tree = ast.parse(fin.read(), filename)
+
+  aliases = {}
+  used = {}
+  for node in ast.walk(tree):
+    if isinstance(node, ast.Import):
+      for alias in node.names:
+        if sibling(alias.name):
+          aliases[alias.asname or alias.name] = alias.name
+          used.setdefault(alias.name, set())
+    elif isinstance(node, ast.ImportFrom):
+      if node.module and sibling(node.module):
+        used.setdefault(node.module, set()).update(
+          alias.name for alias in node.names
+        )
+
+  for node in ast.walk(tree):
+    if (
+      isinstance(node, ast.Attribute)
+  and isinstance(node.value, ast.Name)
+  and node.value.id in aliases
+    ):
+      used[aliases[node.value.id]].add(node.attr)
+  return used
+
+class Fingerprint:
+  """
+  Hashes Python values by content, including functions (by bytecode,
+  constants, closure contents, and the module globals and sibling module
+  attributes they refer to) and classes (by their methods and class-level
+  attributes), without following any value more than once.
+  """
+  def __init__(self):
+    self.digest = hashlib.sha256()
+    self.seen = set()
+
+  def add(self, *parts):
+    for part in parts:
+      self.digest.update(repr(part).encode("utf-8"))
+      self.digest.update(b"\0")
+
+  def value(self, value):
+    if isinstance(value, (types.FunctionType, types.CodeType, type)):
+      key = id(value)
+      if key in self.seen:
+        self.add("seen", getattr(value, "__qualname__", None))
+        return
+      self.seen.add(key)
+
+    if isinstance(value, types.FunctionType):
+      self.add("function", value.__qualname__)
+      self.code(value.__code__, value.__globals__)
+      self.value(value.__defaults__)
+      for cell in value.__closure__ or ():
+        try:
+          contents = cell.cell_contents
+        except ValueError:
+          self.add("empty cell")
+        else:
+          self.value(contents)
+    elif isinstance(value, types.ModuleType):
+      self.add("module", value.__name__)
+    elif isinstance(value, type):
+      self.add("class", value.__qualname__)
+      for name, member in sorted(vars(value).items()):
+        if isinstance(member, (staticmethod, classmethod)):
+          member = member.__func__
+        # Methods and class-level constants, but not bookkeeping like __dict__
+        if isinstance(member, types.FunctionType) or not name.startswith("__"):
+          self.add(name)
+          self.value(member)
+    elif isinstance(value, dict):
+      self.add("dict", len(value))
+      for k, v in sorted(value.items(), key=lambda kv: repr(kv[0])):
+        self.value(k)
+        self.value(v)
+    elif isinstance(value, (list, tuple)):
+      self.add(type(value).__name__, len(value))
+      for item in value:
+        self.value(item)
+    elif isinstance(value, (set, frozenset)):
+      self.add("set", sorted(repr(item) for item in value))
+    elif " at 0x" in repr(value):
+      # Other objects whose repr changes from run to run
+      self.add("object", type(value).__qualname__)
+    else:
+      self.add(value)
+
+  def code(self, code, module_globals):
+    self.add(code.co_code, code.co_names, code.co_varnames)
+    for const in code.co_consts:
+      if isinstance(const, types.CodeType):
+        self.code(const, module_globals)
+      else:
+        self.value(const)
+
+    modules = [
+      g for g in module_globals.values()
+        if isinstance(g, types.ModuleType)
+        and sibling(g.__name__)
+    ]
+    for name in code.co_names:
+      if name in module_globals and name != "__builtins__":
+        self.add("global", name)
+        self.value(module_globals[name])
+      # Attributes of sibling modules the function may use
+      for module in modules:
+        if name in vars(module):
+          self.add("attribute", module.__name__, name)
+          self.value(vars(module)[name])
+
+  def hexdigest(self):
+    return self.digest.hexdigest()
+
+def code_hash(script):
+  """
+  Returns a hash of a stage script together with the parts of the sibling
+  modules that it uses.
+  """
+  fingerprint = Fingerprint()
+  fingerprint.add(file_hash(os.path.join(DATA_DIR, script)))
+  for name, attributes in sorted(
+    used_attributes(os.path.join(DATA_DIR, script)).items()
+  ):
+    try:
+      module = importlib.import_module(name)
+    except Exception:
+      # Can't import it here, so depend on the whole file instead
+      fingerprint.add(name, file_hash(sibling(name)))
+      continue
+    for attribute in sorted(attributes):
+      fingerprint.add(name, attribute)
+      fingerprint.value(getattr(module, attribute, None))
+  return fingerprint.hexdigest()
+
+def instantiate(stage, n):
+  return {
+    key: (
+      [s.replace("{n}", n) for s in value] if isinstance(value, list)
+        else value.replace("{n}", n)
+    )
+      for key, value in stage.items()
+  }
+
+def find_stage(target):
+  """
+  Returns the stage (with "{n}" filled in) that produces the given target.
+  """
+  for stage in STAGES:
+    for output in stage["outputs"]:
+      pattern = re.escape(output).replace(re.escape("{n}"), "([0-9]+)")
+      match = re.fullmatch(pattern, target)
+      if match:
+        return instantiate(stage, match.group(1) if match.groups() else "")
+  return None
+
+def plan(targets):
+  """
+  Returns the stages needed to build the given targets, in dependency
+  order, along with a mapping from each stage's first output to the first
+  outputs of the stages it depends on.
+  """
+  order = []
+  deps = {}
+  sources = set()
+
+  def exists(target):
+    return os.path.exists(os.path.join(DATA_DIR, target.lstrip("?")))
+
+  def visit(target):
+    """
+    Returns the first output of the stage that makes the given target, or
+    None if it's a source file.
+    """
+    stage = find_stage(target)
+    if stage == None:
+      if not target.startswith("?") and not exists(target):
+        raise ValueError("Don't know how to make '{}'.".format(target))
+      return None
+    key = stage["outputs"][0]
+    if key in sources:
+      return None
+    if key not in deps:
+      try:
+        found = set(visit(inp) for inp in stage["inputs"])
+      except ValueError:
+        # Like "make -o": existing outputs whose inputs (say, the raw batch
+        # files) aren't available are used as they are
+        if all(exists(output) for output in stage["outputs"]):
+          sources.add(key)
+          return None
+        raise
+      deps[key] = found - {None}
+      order.append(stage)
+    return key
+
+  for target in targets:
+    visit(target)
+  return order, deps
+
+def input_hashes(stage):
+  hashes = {}
+  for inp in stage["inputs"]:
+    path = os.path.join(DATA_DIR, inp.lstrip("?"))
+    hashes[inp] = file_hash(path) if os.path.exists(path) else None
+  return hashes
+
+def stage_key(stage, code):
+  """
+  Returns everything about a stage that has to match its cached run.
+  """
+  return {
+    "command": stage["command"],
+    "inputs": input_hashes(stage),
+    "code": { script: code[script] for script in stage["scripts"] },
+  }
+
+def up_to_date(stage, key, cache):
+  entry = cache.get(stage["outputs"][0])
+  if entry == None or entry["key"] != key:
+    return False
+  for output in stage["outputs"]:
+    path = os.path.join(DATA_DIR, output)
+    if not os.path.exists(path) or file_hash(path) != entry["outputs"][output]:
+      return False
+  return True
+
+def run_stage(stage):
+  print(stage["command"], flush=True)
+  subprocess.run(stage["command"], shell=True, cwd=DATA_DIR, check=True)
+
+def build(targets, workers=None, dry_run=False, force=False):
+  """
+  Builds the given targets, running each stage whose inputs or code changed
+  since its last run once all of the stages it depends on have finished.
+  Returns the list of stages that ran (or would have, for a dry run).
+  """
+  order, deps = plan(targets)
+
+  cache_path = os.path.join(DATA_DIR, CACHE_FILE)
+  cache = {}
+  if os.path.exists(cache_path):
+    with open(cache_path, 'r') as fin:
+      cache = json.load(fin)
+
+  if DATA_DIR not in sys.path:
+    sys.path.insert(0, DATA_DIR)
+  scripts = sorted(set(s for stage in order for s in stage["scripts"]))
+  code = { script: code_hash(script) for script in scripts }
+
+  stages = { stage["outputs"][0]: stage for stage in order }
+  done = set()
+  ran = []
+  running = {}
+  keys = {}
+  with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+    while len(done) < len(stages):
+      ready = [
+        name for name in stages
+          if name not in done
+          and name not in running.values()
+          and deps[name] <= done
+      ]
+      for name in ready:
+        stage = stages[name]
+        # Inputs are only hashed once everything upstream is finished
+        key = stage_key(stage, code)
+        if not force and up_to_date(stage, key, cache):
+          done.add(name)
+          continue
+        ran.append(name)
+        if dry_run:
+          print(stage["command"])
+          done.add(name)
+          continue
+        running[pool.submit(run_stage, stage)] = name
+        keys[name] = key
+
+      if not running:
+        continue
+
+      finished, _ = concurrent.futures.wait(
+        running,
+        return_when=concurrent.futures.FIRST_COMPLETED
+      )
+      for future in finished:
+        name = running.pop(future)
+        future.result()
+        cache[name] = {
+          "key": keys[name],
+          "outputs": {
+            output: file_hash(os.path.join(DATA_DIR, output))
+              for output in stages[name]["outputs"]
+          },
+        }
+        done.add(name)
+        with open(cache_path, 'w') as fout:
+          json.dump(cache, fout, indent=1)
+
+  return ran
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Builds analysis targets, skipping unchanged stages."
+  )
+  parser.add_argument("targets", nargs='+', metavar="TARGET")
+  parser.add_argument("-j", "--workers", type=int, default=None)
+  parser.add_argument("-n", "--dry-run", action="store_true")
+  parser.add_argument("--force", action="store_true")
+  args = parser.parse_args()
+
+  try:
+    ran = build(args.targets, args.workers, args.dry_run, args.force)
+  except subprocess.CalledProcessError as e:
+    print("Error: '{}' failed.".format(e.cmd), file=sys.stderr)
+    sys.exit(1)
+  if not ran:
+    print("Everything is up to date.")
+
+if __name__ == "__main__":
+  main()
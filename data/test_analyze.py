@@ -0,0 +1,40 @@
+"""
+test_analyze.py
+
+Tests for the exact permutation test in analyze.py. Run with pytest from
+this directory.
+"""
+
+import itertools
+import math
+
+import numpy as np
+
+import analyze
+
+def test_subset_sum_distribution_matches_enumeration():
+  ints = [0, 1, 1, 2, 3, 5, 5, 8]
+  for k in range(len(ints) + 1):
+    offset, dist = analyze.subset_sum_distribution(ints, k)
+    sums = [sum(c) for c in itertools.combinations(ints, k)]
+    for s in set(sums):
+      assert math.isclose(dist[s - offset], sums.count(s) / len(sums))
+
+def test_exact_p_value_large_stratum_is_finite():
+  # 3000 choose 1500 overflows float64, but the stratum fits the budget
+  big = [2.0] * 3000
+  small = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+  groups = {
+    "=big": [big, list(range(1500)), list(range(1500, 3000))],
+    "=small": [small, [3, 4, 5], [0, 1, 2]],
+  }
+  positive = (3000 + 15) / 1503
+  alternate = (3000 + 6) / 1503
+  p = analyze.exact_p_value(groups, positive - alternate)
+  assert p != None and np.isfinite(p)
+
+  # The big stratum's sum is constant, so only the small one matters
+  tail = [
+    c for c in itertools.combinations(small, 3) if sum(c) >= 15
+  ]
+  assert math.isclose(p, len(tail) / math.comb(6, 3))
@@ -10,16 +10,43 @@ Get characterData.json from:
 
 Full app that we're using data from:
   https://fullmeter.com/fatonline/#/framedata/
+
+Run with "corpus" to record how the pre-rewrite parsers (kept in
+reference_parsers.py) parse every raw value string in the roster (in
+parse_corpus.json), or with "check" to re-parse that corpus with the current
+parsers and report any values whose results differ. Otherwise, "-j N" (or "--workers N")
+sets how many processes analyze characters in parallel (default: one per
+core).
+
+Only the roster's entries are pulled out of characterData.json, by streaming
+through it; each one is cached under extracts/ (keyed by the file's hash) so
+reruns on the same file skip that parse. Pass "--no-cache" to bypass this.
 """
 
 import json
 import csv
 import sys
-import random
+import re
+import math
+import time
+import itertools
+import functools
+import hashlib
+import os
+import urllib.parse
+import bisect
+import multiprocessing
+
+import numpy as np
+import scipy.stats
 
 #P_THRESHOLD = 0.2
 P_THRESHOLD = 0.05
 
+# How many random permutations to hold in memory at once
+PERMUTATION_BATCH = 5000
+
+
 idmap = {
   "abigail": "Abigail",
   "akuma": "Akuma",
@@ -265,8 +292,17 @@ combined_tones = {
 CPROPS = None
 CPFILE = "all_chars.csv"
 
+DATAFILE = "characterData.json"
 TSVFILE = "framedata.tsv"
 JSONFILE = "framedata.json"
+CORPUSFILE = "parse_corpus.json"
+
+# Per-character extracts of DATAFILE go in a subdirectory of this named for
+# the hash of the DATAFILE they came from
+EXTRACT_DIR = "extracts"
+
+# How much of DATAFILE to read at once while streaming through it
+READ_CHUNK = 1 << 20
 
 def define_cprops():
   """
@@ -280,50 +316,282 @@ def define_cprops():
       cid = rin["id"]
       CPROPS[cid] = rin
 
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DELIMITER = re.compile(r'[ \t\n\r,}\]]')
+_DECODER = json.JSONDecoder()
+
+class ObjectStream:
+  """
+  Reads the members of a file's top-level JSON object incrementally, holding
+  only a chunk of the file (or a single member, if that's bigger) in memory
+  at once.
+  """
+  def __init__(self, fin, chunk_size=READ_CHUNK):
+    self.fin = fin
+    self.chunk_size = chunk_size
+    self.buf = ""
+    self.pos = 0
+    self.eof = False
+
+  def fill(self):
+    """
+    Drops the consumed part of the buffer and reads another chunk, returning
+    False if the file is exhausted. Chunks grow to match whatever is still
+    unconsumed, so a value that spans many chunks isn't re-decoded from its
+    start once per chunk.
+    """
+    chunk = self.fin.read(max(self.chunk_size, len(self.buf) - self.pos))
+    if not chunk:
+      self.eof = True
+      return False
+    self.buf = self.buf[self.pos:] + chunk
+    self.pos = 0
+    return True
+
+  def fail(self, expected):
+    raise ValueError(
+      "Malformed JSON: expected {} but found {!r}".format(
+        expected,
+        self.buf[self.pos:self.pos + 20]
+      )
+    )
+
+  def peek(self):
+    """
+    Skips whitespace and returns the next character (or None at the end of
+    the file) without consuming it.
+    """
+    while True:
+      self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+      if self.pos < len(self.buf):
+        return self.buf[self.pos]
+      if not self.fill():
+        return None
+
+  def expect(self, char):
+    if self.peek() != char:
+      self.fail(repr(char))
+    self.pos += 1
+
+  def string(self):
+    """
+    Consumes and returns a JSON string.
+    """
+    if self.peek() != '"':
+      self.fail("a string")
+    while True:
+      try:
+        result, self.pos = json.decoder.scanstring(self.buf, self.pos + 1)
+        return result
+      except json.JSONDecodeError:
+        if not self.fill():
+          raise
+
+  def value(self):
+    """
+    Consumes and decodes a JSON value.
+    """
+    if self.peek() not in ('{', '[', '"'):
+      # Make sure a bare number or literal isn't cut off by the buffer's end
+      while _DELIMITER.search(self.buf, self.pos) == None and self.fill():
+        pass
+    while True:
+      try:
+        result, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+        return result
+      except json.JSONDecodeError:
+        if not self.fill():
+          raise
+
+  def members(self, wanted=None):
+    """
+    Yields (key, value) pairs for the top-level object's members whose keys
+    are in wanted (or all of them if wanted is None). Stops reading as soon
+    as every wanted key has been seen.
+    """
+    remaining = None if wanted == None else set(wanted)
+    if remaining == set():
+      return
+    self.expect('{')
+    if self.peek() == '}':
+      return
+    while True:
+      key = self.string()
+      self.expect(':')
+      # Unwanted members still go through the (C) decoder, which is much
+      # faster than scanning past them in Python; they're just not kept
+      value = self.value()
+      if remaining == None or key in remaining:
+        yield key, value
+        if remaining != None:
+          remaining.discard(key)
+          if not remaining:
+            return
+      if self.peek() == '}':
+        return
+      self.expect(',')
+
+def file_hash(filename):
+  """
+  Returns the SHA-256 hex digest of the given file's contents.
+  """
+  digest = hashlib.sha256()
+  with open(filename, 'rb') as fin:
+    for chunk in iter(lambda: fin.read(READ_CHUNK), b""):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+def roster_ids():
+  """
+  Returns every characterData.json ID used by the roster in idmap.
+  """
+  return [cid for ch in idmap for cid in variant_ids(ch)]
+
+def load_characters(cids, filename=DATAFILE, use_cache=True):
+  """
+  Returns a dictionary holding just the given characters' entries from the
+  given characterData.json file, streaming through it instead of decoding
+  the whole thing. If use_cache is True, each character's entry is also
+  saved in its own file under EXTRACT_DIR (keyed by the hash of the source
+  file), so that later runs on the same file can skip the big parse.
+  """
+  result = {}
+  cache = None
+  if use_cache:
+    cache = os.path.join(EXTRACT_DIR, file_hash(filename))
+    for cid in cids:
+      path = os.path.join(cache, urllib.parse.quote(cid, safe="") + ".json")
+      if os.path.exists(path):
+        with open(path, 'r') as fin:
+          result[cid] = json.load(fin)
+
+  missing = [cid for cid in cids if cid not in result]
+  if missing:
+    with open(filename, 'r') as fin:
+      for cid, cdata in ObjectStream(fin).members(missing):
+        result[cid] = cdata
+    absent = [cid for cid in missing if cid not in result]
+    if absent:
+      raise KeyError(
+        "Characters missing from '{}': {}".format(filename, ", ".join(absent))
+      )
+    if cache != None:
+      os.makedirs(cache, exist_ok=True)
+      for cid in missing:
+        path = os.path.join(cache, urllib.parse.quote(cid, safe="") + ".json")
+        with open(path, 'w') as fout:
+          json.dump(result[cid], fout)
+
+  return result
+
+def permutation_batches(n, trials, seed, batch_size=PERMUTATION_BATCH):
+  """
+  Yields arrays of random permutations of range(n), one permutation per row,
+  in batches of at most batch_size rows until trials permutations have been
+  produced.
+  """
+  rng = np.random.RandomState(seed)
+  done = 0
+  while done < trials:
+    rows = min(batch_size, trials - done)
+    yield np.argsort(rng.random_sample((rows, n)), axis=1)
+    done += rows
+
+def labeling_count(n, pos_count, alt_count):
+  """
+  Returns the number of distinct ways to pick pos_count positive and alt_count
+  alternate items out of n.
+  """
+  return math.comb(n, pos_count) * math.comb(n - pos_count, alt_count)
+
+def labeling_batches(n, pos_count, alt_count, batch_size=PERMUTATION_BATCH):
+  """
+  Enumerates every way of picking pos_count positive and alt_count alternate
+  items out of n, yielding (positive, alternate) pairs of index arrays with one
+  labeling per row.
+  """
+  alt_local = np.array(
+    list(itertools.combinations(range(n - pos_count), alt_count)),
+    dtype=int
+  ).reshape(-1, alt_count)
+  per_pos = len(alt_local)
+  combos = itertools.combinations(range(n), pos_count)
+  chunk = max(1, batch_size // per_pos)
+  while True:
+    pos = np.array(
+      list(itertools.islice(combos, chunk)),
+      dtype=int
+    ).reshape(-1, pos_count)
+    if len(pos) == 0:
+      break
+    chosen = np.zeros((len(pos), n), dtype=bool)
+    np.put_along_axis(chosen, pos, True, axis=1)
+    # Stable sort puts the unchosen indices first, in order:
+    rest = np.argsort(chosen, axis=1, kind="stable")[:, :n - pos_count]
+    yield (
+      np.repeat(pos, per_pos, axis=0),
+      rest[:, alt_local].reshape(-1, alt_count)
+    )
+
+def count_extreme(tmds, md):
+  """
+  Counts how many trial mean differences are at least as extreme as md in
+  md's direction. A small tolerance keeps the observed labeling itself from
+  being lost to floating-point noise.
+  """
+  tol = 1e-9 * max(1, abs(md))
+  if md > 0:
+    return int(np.count_nonzero(tmds >= md - tol))
+  elif md < 0:
+    return int(np.count_nonzero(tmds <= md + tol))
+  else:
+    return 0
+
 def bootstrap_test(
   items,
   index,
   pos_filter,
   alt_filter=None,
   trials=15000,
-  seed=1081230891
+  seed=1081230891,
+  exact_threshold=None
 ):
-  pos_mean = 0
-  pos_count = 0
-  alt_mean = 0
-  alt_count = 0
+  """
+  Tests whether index differs between the items that match pos_filter and
+  those that match alt_filter (or all other items if alt_filter is None) by
+  comparing the observed mean difference against random relabelings of the
+  stat values. Returns the mean difference and the fraction of relabelings
+  with a difference at least that extreme.
+
+  When the positive and alternate groups don't overlap and there are at most
+  exact_threshold distinct labelings (by default, no more than the number of
+  trials), all of them are enumerated and the p-value is exact; otherwise
+  trials random permutations are used. With a full roster (about 65
+  characters) only groups of one or two items have few enough labelings for
+  the default, so exact mode is effectively opt-in: pass a larger
+  exact_threshold to use it more widely (enumeration takes time proportional
+  to the labeling count).
+  """
+  if exact_threshold == None:
+    exact_threshold = trials
+
   vals = []
   hits = []
   alts = []
-  slippage = 0
-  for i, item in enumerate(items):
-    val = item.get(index)
+  for item in items:
+    val = get_value(item, index)
     if val == None:
-      if '.' in index:
-        outer, inner = index.split('.')
-        val = item[outer].get(inner)
-        if val == None:
-          slippage += 1
-          continue
-      else:
-        slippage += 1
-        continue
-    vals.append(val)
+      continue
     if pos_filter(item):
-      hits.append(i - slippage)
-      pos_mean += val
-      pos_count += 1
+      hits.append(len(vals))
     elif alt_filter == None:
-      alts.append(i - slippage)
-      alt_mean += val
-      alt_count += 1
+      alts.append(len(vals))
 
     if alt_filter != None and alt_filter(item):
-      alts.append(i - slippage)
-      alt_mean += val
-      alt_count += 1
+      alts.append(len(vals))
+    vals.append(val)
 
-  if pos_count == 0:
+  if len(hits) == 0:
     raise ValueError(
       "No positive examples for '{}' ('{}' vs. '{}')".format(
         index,
@@ -331,7 +599,7 @@ def bootstrap_test(
         '<rest>' if alt_filter == None else alt_filter.__name__
       )
     )
-  if alt_count == 0:
+  if len(alts) == 0:
     raise ValueError(
       "No alternate examples for '{}' ('{}' vs. '{}')".format(
         index,
@@ -340,26 +608,31 @@ def bootstrap_test(
       )
     )
 
-  pos_mean /= pos_count
-  alt_mean /= alt_count
-
-  md = pos_mean - alt_mean
+  vals = np.array(vals, dtype=float)
+  hits = np.array(hits)
+  alts = np.array(alts)
+
+  md = float(vals[hits].mean() - vals[alts].mean())
+
+  n = len(vals)
+  disjoint = len(np.intersect1d(hits, alts)) == 0
+  if (
+    disjoint
+    and labeling_count(n, len(hits), len(alts)) <= exact_threshold
+  ):
+    as_diff = 0
+    total = 0
+    for pos, alt in labeling_batches(n, len(hits), len(alts)):
+      tmds = vals[pos].mean(axis=1) - vals[alt].mean(axis=1)
+      as_diff += count_extreme(tmds, md)
+      total += len(tmds)
+    return md, as_diff / total
 
-  random.seed(seed)
   as_diff = 0
-  for t in range(trials):
-    random.shuffle(vals)
-    pos_mean = 0
-    alt_mean = 0
-    for i in hits:
-      pos_mean += vals[i]
-    for i in alts:
-      alt_mean += vals[i]
-    pos_mean /= pos_count
-    alt_mean /= alt_count
-    tmd = pos_mean - alt_mean
-    if (md > 0 and tmd >= md) or (md < 0 and tmd <= md):
-      as_diff += 1
+  for perms in permutation_batches(n, trials, seed):
+    shuffled = vals[perms]
+    tmds = shuffled[:, hits].mean(axis=1) - shuffled[:, alts].mean(axis=1)
+    as_diff += count_extreme(tmds, md)
 
   return md, as_diff / trials
 
@@ -376,55 +649,88 @@ def rank_positions(
   items,
   index,
   pos_filter,
-  alt_filter=None
+  alt_filter=None,
+  method="dense"
 ):
-  if alt_filter == None:
-    alt_filter = lambda x: not pos_filter(x)
-
-  relevant = list(
-    filter(
-      lambda x: (
-        get_value(x, index) != None
-    and (pos_filter(x) or alt_filter(x))
-      ),
-      items
-    )
-  )
+  """
+  Ranks the items with a value for index that pass either filter by that
+  value, and returns the mean normalized rank position (0 for the lowest
+  value to 1 for the highest) of the items passing pos_filter and of the
+  rest passing alt_filter (which defaults to not pos_filter). See
+  rank_positions_batch for method.
+  """
+  return rank_positions_batch(
+    items,
+    [(index, pos_filter, alt_filter)],
+    method
+  )[0]
 
-  rs1 = 0
-  rs2 = 0
 
-  ordered = sorted(
-    relevant,
-    key=lambda x: get_value(x, index)
-  )
+def stats_matrix(items, indices):
+  """
+  Builds a float array with one row per item and one column per index,
+  holding NaN where an item has no value.
+  """
+  result = np.full((len(items), len(indices)), np.nan)
+  for i, item in enumerate(items):
+    for j, index in enumerate(indices):
+      val = get_value(item, index)
+      if val != None:
+        result[i, j] = val
+  return result
 
-  # Give equal ranks to tied items:
-  ranked = []
-  prev_val = None
-  rank = 0
-  for item in ordered:
-    val = get_value(item, index)
-    if prev_val == None or val != prev_val:
-      prev_val = val
-      rank += 1 # first rank assigned will be 1
-    ranked.append((rank, item))
 
-  last_rank = rank
+def rank_positions_batch(items, tests, method="dense"):
+  """
+  Does the work of rank_positions for a whole list of (index, pos_filter,
+  alt_filter) tests at once, returning a list of (positive, alternate) mean
+  rank positions. Values are gathered into a single matrix and each filter is
+  applied to the items just once, however many tests share it.
+
+  With method "dense", tied values share a rank and ranks run through the
+  distinct values without gaps (so positions are spread over the distinct
+  values). With method "average", ties get the average of the ranks they
+  span, as in a standard rank-sum test (so positions are spread over the
+  items). Means come back as NaN when a group is empty or every relevant
+  item has the same value.
+  """
+  indices = list(dict.fromkeys(index for index, _, _ in tests))
+  column = { index: j for j, index in enumerate(indices) }
+  matrix = stats_matrix(items, indices)
+
+  masks = {}
+  def mask(filt):
+    if filt not in masks:
+      masks[filt] = np.array([bool(filt(item)) for item in items], dtype=bool)
+    return masks[filt]
+
+  result = []
+  for index, pos_filter, alt_filter in tests:
+    pos = mask(pos_filter)
+    if alt_filter == None:
+      alt = ~pos
+    else:
+      alt = mask(alt_filter) & ~pos # items passing both count as positive
 
-  pos_rps = []
-  alt_rps = []
-  for rank, item in ranked:
-    rank_pos = (rank - 1) / (last_rank - 1)
-    if pos_filter(item):
-      pos_rps.append(rank_pos)
-    elif alt_filter(item):
-      alt_rps.append(rank_pos)
+    vals = matrix[:, column[index]]
+    relevant = ~np.isnan(vals) & (pos | alt)
+    ranks = scipy.stats.rankdata(vals[relevant], method=method)
+    if method == "dense":
+      last_rank = ranks.max(initial=0)
     else:
-      # Shouldn't be possible because of filter above
-      print("Ranked item isn't positive or alternative:\n{}".format(item))
+      last_rank = len(ranks)
 
-  return sum(pos_rps)/len(pos_rps), sum(alt_rps) / len(alt_rps)
+    if last_rank > 1:
+      positions = (ranks - 1) / (last_rank - 1)
+    else:
+      positions = np.full(len(ranks), np.nan)
+
+    means = []
+    for group in (pos[relevant], alt[relevant]):
+      means.append(float(positions[group].mean()) if group.any() else math.nan)
+    result.append(tuple(means))
+
+  return result
 
 
 def average_missing(*vals):
@@ -463,103 +769,294 @@ def jump_height(x):
   else:
     return sum(float(b) for b in x[1:-1].split('+'))
 
+# Frame-data value grammar, compiled once. Most values are plain numbers,
+# runs of integers joined by '+' or '*', numbers with a parenthesized note,
+# or active frames with parenthesized gaps like "3(5)2"; anything else falls
+# through to the general-case parsing below each fast path.
+_NUMBER = re.compile(r"\s*-?\d+(?:\.\d+)?\s*")
+_NUMBER_RUN = re.compile(r"\s*\d+\s*([+*])\s*\d+\s*(?:\1\s*\d+\s*)*")
+_NUMBER_NOTE = re.compile(r"\s*(-?\d+(?:\.\d+)?)\s*\([^+*]*")
+_FRAMES = re.compile(
+  r"\d+(?:\.\d+)?(?:\(\d+(?:\.\d+)?\)\d+(?:\.\d+)?)*(?:\(\d+(?:\.\d+)?\)~?)?"
+)
+_INTEGER = re.compile(r"\d+")
+_DECIMAL = re.compile(r"\d+(?:\.\d+)?")
+_DAMAGE_CUT = re.compile(r" per dagger|[(/]")
+
+# Parsed values are cached by raw string (identical strings recur across
+# moves and character variants). The cached parsers return tuples; the
+# public wrappers hand out fresh lists.
+PARSE_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _stat_value(x):
+  if x in ['?', '~', '-']:
+    return None
+  elif _NUMBER.fullmatch(x):
+    return float(x)
+  elif _NUMBER_RUN.fullmatch(x):
+    return float(sum(int(d) for d in _INTEGER.findall(x)))
+
+  note = _NUMBER_NOTE.fullmatch(x)
+  if note:
+    return float(note.group(1))
+  elif '+' in x:
+    bits = x.split('+')
+    vals = [float(b) for b in bits if b.strip().isdigit()]
+    return sum(vals)
+  elif '*' in x:
+    bits = x.split('*')
+    vals = [float(b) for b in bits if b.strip().isdigit()]
+    return sum(vals)
+  elif '(' in x:
+    return float(x[:x.index('(')])
+  else:
+    return float(x)
+
 def stat_value(x):
   if type(x) == str:
-    if x in ['?', '~', '-']:
-      return None
-    elif '+' in x:
-      bits = x.split('+')
-      vals = [float(b) for b in bits if b.strip().isdigit()]
-      return sum(vals)
-    elif '*' in x:
-      bits = x.split('*')
-      vals = [float(b) for b in bits if b.strip().isdigit()]
-      return sum(vals)
-    elif '(' in x:
-      return float(x[:x.index('(')])
-    else:
-      return float(x)
+    return _stat_value(x)
   elif x is None:
     return x
   else:
     return float(x)
 
-def active_frames(x):
-  if type(x) == str:
-    if '*' in x:
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _active_frames(x):
+  if '*' in x:
+    active = []
+    gaps = []
+    bits = x.split('*')
+    for i, b in enumerate(bits):
+      subact, subgaps = _active_frames(b)
+      active.extend(subact)
+      gaps.extend(subgaps)
+      if i < len(bits) - 1:
+        gaps.append(0)
+    return (tuple(active), tuple(gaps))
+  elif x == '~':
+    return ((0,), ())
+  elif _FRAMES.fullmatch(x):
+    nums = [float(n) for n in _DECIMAL.findall(x)]
+    return (tuple(nums[0::2]), tuple(nums[1::2]))
+  else:
+    try:
       active = []
       gaps = []
-      bits = x.split('*')
+      norm = x.replace(")", "_").replace("(", "_")
+      bits = norm.split("_")
       for i, b in enumerate(bits):
-        subact, subgaps = active_frames(b)
-        active.extend(subact)
-        gaps.extend(subgaps)
-        if i < len(bits) - 1:
-          gaps.append(0)
-      return (active, gaps)
-    elif x == '~':
-      return ([0], [])
-    else:
-      try:
-        active = []
-        gaps = []
-        norm = x.replace(")", "_").replace("(", "_")
-        bits = norm.split("_")
-        for i, b in enumerate(bits):
-          if b in ('', '~') and i == len(bits) - 1:
-            # ignore blank or ~ at end
-            continue
-          if i % 2 == 0:
-            active.append(float(b))
-          else:
-            gaps.append(float(b))
-        return (active, gaps)
-      except:
-        raise ValueError("Bad active frames value: '{}'".format(x))
+        if b in ('', '~') and i == len(bits) - 1:
+          # ignore blank or ~ at end
+          continue
+        if i % 2 == 0:
+          active.append(float(b))
+        else:
+          gaps.append(float(b))
+      return (tuple(active), tuple(gaps))
+    except:
+      raise ValueError("Bad active frames value: '{}'".format(x))
+
+def active_frames(x):
+  if type(x) == str:
+    active, gaps = _active_frames(x)
+    return (list(active), list(gaps))
   return ([x], [])
 
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _on_hit(x):
+  if "KD" in x:
+    return "knockdown"
+  elif x in ["?", "~"]:
+    return None
+  elif '/' in x:
+    return min(float(b) for b in x.split('/'))
+
 def on_hit(x):
   if type(x) == str:
-    if "KD" in x:
-      return "knockdown"
-    elif x in ["?", "~"]:
-      return None
-    elif '/' in x:
-      return min(float(b) for b in x.split('/'))
+    return _on_hit(x)
   else:
     return x
 
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _damage_values(x):
+  # Drop everything from the first " per dagger", note, or alternative:
+  cut = _DAMAGE_CUT.search(x)
+  if cut:
+    x = x[:cut.start()]
+
+  if x in "?~":
+    return None
+  elif '+' in x:
+    result = []
+    for b in x.split('+'):
+      result.extend(_damage_values(b))
+    return tuple(result)
+  else:
+    result = []
+    for b in x.split('*'):
+      if 'x' in b:
+        first, second = b.split('x')
+        b = float(first) * float(second)
+      result.append(float(b))
+    return tuple(result)
+
 def damage_values(x):
   if type(x) == str:
-    if " per dagger" in x:
-      x = x[:x.index(" per dagger")]
-
-    if "(" in x:
-      x = x[:x.index("(")]
-
-    if '/' in x:
-      x = x[:x.index("/")]
-
-    if x in "?~":
-      return None
-    elif '+' in x:
-      bits = x.split('+')
-      result = []
-      for b in bits:
-        result.extend(damage_values(b))
-      return result
-    else:
-      bits = x.split("*")
-      result = []
-      for b in bits:
-        if 'x' in b:
-          first, second = b.split('x')
-          b = float(first) * float(second)
-        result.append(float(b))
-      return result
+    result = _damage_values(x)
+    return None if result is None else list(result)
   else:
     return [x]
 
+# Which raw fields each parser is applied to, for the regression corpus:
+CORPUS_FIELDS = {
+  "stat_value": {
+    "stats": [
+      "health",
+      "stun",
+      "fJumpDist",
+      "bJumpDist",
+      "fDashDist",
+      "bDashDist",
+      "fWalk",
+      "bWalk",
+      "throwRange",
+    ],
+    "moves": ["startup", "recovery"],
+  },
+  "active_frames": { "moves": ["active"] },
+  "on_hit": { "moves": ["onHit", "onBlock"] },
+  "damage_values": { "moves": ["damage", "stun"] },
+}
+
+# Values recorded in the corpus along with the roster's, so every branch of
+# the parsers is covered whatever characterData.json holds:
+CORPUS_EXTRAS = {
+  "stat_value": [
+    "?", "~", "-", "12", " 7 ", "-3", "2.5", "3+4", "3 + 4 + 5", "2*3*4",
+    "3+4*5", "1+?", "10(14)", "-2 (on block)", "14 (+5)", "5(3)+2", "abc",
+  ],
+  "active_frames": [
+    "~", "3", "2.5", "3(5)2", "3(5)2(4)1", "3(5)", "3(5)~", "2*3",
+    "3(5)2*4", "1*~", "3()2", "x", "3(a)2",
+  ],
+  "on_hit": [
+    "KD", "+2 KD", "?", "~", "+3/-2", "-4/1/0", "5", "abc",
+  ],
+  "damage_values": [
+    "?", "~", "", "100", "30+40", "20*3", "2x5", "10+2x3*4", "50 per dagger",
+    "60(80)", "70/90", "15+20 (counter)", "3x", "abc",
+  ],
+}
+
+PARSERS = {
+  "stat_value": stat_value,
+  "active_frames": active_frames,
+  "on_hit": on_hit,
+  "damage_values": damage_values,
+}
+
+def reference_parser_table():
+  """
+  Returns a table like PARSERS of the pre-rewrite parsers. They're imported
+  here rather than at the top so that process.py can still be loaded from
+  elsewhere (as data/framedata.py does) without this directory on the path.
+  """
+  import reference_parsers
+  return { name: getattr(reference_parsers, name) for name in PARSERS }
+
+def parse_outcome(parser, raw, parsers=PARSERS):
+  """
+  Returns the JSON-friendly result of parsing raw with the named parser from
+  the given table, or a description of the error it raises.
+  """
+  try:
+    return json.loads(json.dumps(parsers[parser](raw)))
+  except Exception as e:
+    return { "error": "{}: {}".format(type(e).__name__, e) }
+
+def corpus_strings(data):
+  """
+  Collects the distinct raw strings that each parser sees across the roster
+  in the given characterData.json contents.
+  """
+  result = { parser: set() for parser in CORPUS_FIELDS }
+  for ch in idmap:
+    cids = idmap[ch] if isinstance(idmap[ch], (list, tuple)) else [idmap[ch]]
+    for cid in cids:
+      cdata = data[cid]
+      for parser, fields in CORPUS_FIELDS.items():
+        for key in fields.get("stats", []):
+          val = cdata["stats"].get(key, None)
+          if type(val) == str:
+            result[parser].add(val)
+        for group in cdata["moves"]:
+          for move in cdata["moves"][group].values():
+            for key in fields.get("moves", []):
+              val = move.get(key, None)
+              if type(val) == str:
+                result[parser].add(val)
+  return result
+
+def build_corpus():
+  """
+  Writes CORPUSFILE with every raw value string in the roster (plus
+  CORPUS_EXTRAS) and what the reference parsers make of it.
+  """
+  data = load_characters(roster_ids())
+  strings = corpus_strings(data)
+  for parser, extras in CORPUS_EXTRAS.items():
+    strings[parser].update(extras)
+  reference = reference_parser_table()
+  corpus = {
+    parser: {
+      raw: parse_outcome(parser, raw, reference)
+        for raw in sorted(strings[parser])
+    }
+      for parser in strings
+  }
+  with open(CORPUSFILE, 'w') as fout:
+    json.dump(corpus, fout, indent=1, sort_keys=True)
+  print(
+    "Wrote {} values to '{}'.".format(
+      sum(len(v) for v in corpus.values()),
+      CORPUSFILE
+    )
+  )
+
+def check_corpus():
+  """
+  Re-parses every value in CORPUSFILE and reports any whose result differs
+  from the recorded one. Returns the number of mismatches.
+  """
+  with open(CORPUSFILE, 'r') as fin:
+    corpus = json.load(fin)
+  start = time.perf_counter()
+  mismatches = 0
+  checked = 0
+  for parser in corpus:
+    for raw, expected in corpus[parser].items():
+      checked += 1
+      got = parse_outcome(parser, raw)
+      if got != expected:
+        mismatches += 1
+        print(
+          "Mismatch: {}('{}') -> {} (expected {})".format(
+            parser,
+            raw,
+            got,
+            expected
+          )
+        )
+  print(
+    "Checked {} values in {:.3g}s; {} mismatches.".format(
+      checked,
+      time.perf_counter() - start,
+      mismatches
+    )
+  )
+  return mismatches
+
 def move_info(data):
   st = stat_value(data.get("startup", None))
   act, gaps = active_frames(data.get("active", None))
@@ -596,13 +1093,13 @@ def move_info(data):
 def div(x):
   return (x[0] / x[1]) if (x[1] > 0 and x[0] != None) else None
 
-def analyze(ch, cdata):
+def analyze(ch, cdata, unmatched=None):
   """
   Analyze data for a single character to compute average startup frames, active
   frames, recovery frames, on hit/block frame advantage, and knockdown
-  potential.
+  potential. Normal move names with no move data are appended to unmatched if
+  it's a list.
   """
-  print("Analyzing {}...".format(ch))
   result = { "id": ch }
   # Base stats
   base_stats = cdata["stats"]
@@ -628,23 +1125,88 @@ def analyze(ch, cdata):
   result["throw_range"] = stat_value(base_stats["throwRange"])
 
   # Normal moves
-  result["normals"] = collect_moves_stats(cdata["moves"]["normal"], normals)
+  index = MoveIndex(cdata["moves"])
+  result["normals"] = collect_moves_stats(
+    index,
+    normals,
+    group="normal",
+    unmatched=unmatched
+  )
 
   # All moves
-  allmoves = {}
-  for group in cdata["moves"]:
-    for move in cdata["moves"][group]:
-      allmoves[group + "|" + move] = cdata["moves"][group][move]
-
-  result["all_moves"] = collect_moves_stats(allmoves)
+  result["all_moves"] = collect_moves_stats(index)
 
   return result
 
-def collect_moves_stats(movedata, move_keys=None):
+class MoveIndex:
   """
-  Averages various values from moves in the given moves dictionary. If
-  move_keys is given, it only uses moves that match those keys, with a bit of
-  leeway for inexact matches.
+  Index of a character's moves by (group, name) pairs, kept sorted so that
+  prefix queries take logarithmic time. It also remembers each move's
+  move_info, so moves used by several passes are only analyzed once.
+  """
+  def __init__(self, moves):
+    self.moves = {
+      (group, name): moves[group][name]
+        for group in moves
+        for name in moves[group]
+    }
+    self.keys = sorted(self.moves)
+    self.infos = {}
+
+  def info(self, key):
+    """
+    Returns the (cached) move_info for the given key.
+    """
+    if key not in self.infos:
+      self.infos[key] = move_info(self.moves[key])
+    return self.infos[key]
+
+  def entries(self, group=None):
+    """
+    Returns every key (just those in the given group if one is given) in the
+    original data order.
+    """
+    return [key for key in self.moves if group == None or key[0] == group]
+
+  def with_prefix(self, group, prefix):
+    """
+    Returns the sorted keys in group whose names start with prefix.
+    """
+    result = []
+    i = bisect.bisect_left(self.keys, (group, prefix))
+    while (
+      i < len(self.keys)
+  and self.keys[i][0] == group
+  and self.keys[i][1].startswith(prefix)
+    ):
+      result.append(self.keys[i])
+      i += 1
+    return result
+
+  def find(self, group, name):
+    """
+    Finds moves in group matching name: an exact match, the name with its
+    first letter capitalized, or failing those every move whose name starts
+    with either. Returns a (possibly empty) list of keys.
+    """
+    cname = name[0].capitalize() + name[1:]
+    if (group, name) in self.moves:
+      return [(group, name)]
+    elif (group, cname) in self.moves:
+      return [(group, cname)]
+    else:
+      return sorted(
+        set(self.with_prefix(group, name))
+      | set(self.with_prefix(group, cname))
+      )
+
+def collect_moves_stats(index, move_keys=None, group=None, unmatched=None):
+  """
+  Averages various values from moves in the given MoveIndex (only those in
+  group if one is given). If move_keys is given, it only uses moves that
+  match those keys, with a bit of leeway for inexact matches (see
+  MoveIndex.find); keys that match nothing are appended to unmatched if it's
+  a list.
   """
 
   result = {}
@@ -671,47 +1233,37 @@ def collect_moves_stats(movedata, move_keys=None):
   }
 
   if move_keys != None:
-    keys = move_keys
+    keys = []
+    for mk in move_keys:
+      found = index.find(group, mk)
+      if found:
+        keys.extend(found)
+      elif unmatched != None:
+        unmatched.append(mk)
   else:
-    keys = movedata.keys()
-
-  for mk in keys:
-    cmk = mk[0].capitalize() + mk[1:]
-    if mk in movedata:
-      vals = [ move_info(movedata[mk]) ]
-    elif cmk in movedata:
-      vals = [ move_info(movedata[cmk]) ]
-    else:
-      matches = [k for k in movedata if k.startswith(mk) or k.startswith(cmk)]
-      if matches:
-        vals = [move_info(movedata[m]) for m in matches]
-      else:
-        print(
-          "Missing move data: {} -> '{}' ('{}')".format(ch, mk, cmk),
-          #file=sys.stderr
-        )
-        continue
-
-    for valset in vals:
-      for k in move_avg:
-        if valset[k] != None:
-          v = valset[k]
-          if v != None:
-            move_avg[k][0] += v
-            move_avg[k][1] += 1
-
-      for k in move_cmb:
-        if valset[k] != None:
-          for v in valset[k]:
-            if v != None:
-              move_cmb[k][0] += v
-              move_cmb[k][1] += 1
+    keys = index.entries(group)
 
-      for k in move_prp:
+  for key in keys:
+    valset = index.info(key)
+    for k in move_avg:
+      if valset[k] != None:
         v = valset[k]
         if v != None:
-          move_prp[k][0] += 1 if v else 0
-          move_prp[k][1] += 1
+          move_avg[k][0] += v
+          move_avg[k][1] += 1
+
+    for k in move_cmb:
+      if valset[k] != None:
+        for v in valset[k]:
+          if v != None:
+            move_cmb[k][0] += v
+            move_cmb[k][1] += 1
+
+    for k in move_prp:
+      v = valset[k]
+      if v != None:
+        move_prp[k][0] += 1 if v else 0
+        move_prp[k][1] += 1
 
   result["avg_hit_damage"] = div(move_cmb["damage"])
   result["avg_hit_dizzy"] = div(move_cmb["dizzy"])
@@ -738,76 +1290,178 @@ def collect_moves_stats(movedata, move_keys=None):
   return result
 
 
-def main():
-  define_cprops()
-  with open("characterData.json", 'r') as fin:
-    data = json.load(fin)
+def report_unmatched(unmatched):
+  """
+  Prints a single summary of the normal move names that couldn't be matched
+  to any move data, given a dictionary mapping character IDs to lists of
+  unmatched names.
+  """
+  missing = { cid: unmatched[cid] for cid in unmatched if unmatched[cid] }
+  if not missing:
+    return
+  print(
+    "Unmatched move keys ({} total across {} characters):".format(
+      sum(len(missing[cid]) for cid in missing),
+      len(missing)
+    )
+  )
+  for cid in sorted(missing):
+    print("  {}: {}".format(cid, ", ".join(sorted(set(missing[cid])))))
 
-  chstats = {}
-  for ch in idmap:
-    result = {}
-    if isinstance(idmap[ch], (list, tuple)):
-      for cid in idmap[ch]:
-        stats = analyze(ch, data[cid])
-        for key in stats:
-          if key in result:
-            if result[key] == None or stats[key] == None:
-              result[key] = None
-            elif isinstance(result[key], (int, float)):
-              result[key] += stats[key] # will be divided later to get avg
-            elif isinstance(result[key], dict):
-              rsub = result[key]
-              ssub = stats[key]
-              for subkey in ssub:
-                if subkey in rsub:
-                  if rsub[subkey] == None or ssub[subkey] == None:
-                    rsub[subkey] = None
-                  elif isinstance(rsub[subkey], (int, float)):
-                    rsub[subkey] += ssub[subkey] # divided later to get avg
-                  elif rsub[subkey] != ssub[subkey]:
-                    raise ValueError(
-                      (
-                        "Inconsistent within-character subvalues for '{}'->"
-                      + "'{}': {} != {}"
-                      ).format(
-                        key,
-                        subkey,
-                        rsub[subkey],
-                        ssub[subkey]
-                      )
-                    )
-                  # else keep original sub-value as they're the same
-                else:
-                  rsub[subkey] = ssub[subkey]
-            elif result[key] != stats[key]:
-              raise ValueError(
-                "Inconsistent within-character values for '{}': {} != {}"
-                .format(
-                  key,
-                  result[key],
-                  stats[key]
-                )
-              )
-            # else keep original value (e.g. for 'id')
-          else:
-            result[key] = stats[key]
-      for key in stats:
-        if isinstance(result[key], (int, float)):
-          result[key] /= len(idmap[ch])
+
+def merge_variants(variants):
+  """
+  Averages the analysis results for several variants of one character (e.g.
+  old and young Zeku) into a single result. Numeric values (and numeric
+  sub-values) are averaged, a missing value in any variant makes the merged
+  value missing, and any other values must agree between variants. The
+  reduction runs in variant order so results don't depend on scheduling.
+  """
+  result = {}
+  for stats in variants:
+    for key in stats:
+      if key in result:
+        if result[key] == None or stats[key] == None:
+          result[key] = None
+        elif isinstance(result[key], (int, float)):
+          result[key] += stats[key] # will be divided later to get avg
         elif isinstance(result[key], dict):
-          for subkey in result[key]:
-            if isinstance(result[key][subkey], (int, float)):
-              result[key][subkey] /= len(idmap[ch])
-    else:
-      result = analyze(ch, data[idmap[ch]])
+          rsub = result[key]
+          ssub = stats[key]
+          for subkey in ssub:
+            if subkey in rsub:
+              if rsub[subkey] == None or ssub[subkey] == None:
+                rsub[subkey] = None
+              elif isinstance(rsub[subkey], (int, float)):
+                rsub[subkey] += ssub[subkey] # divided later to get avg
+              elif rsub[subkey] != ssub[subkey]:
+                raise ValueError(
+                  (
+                    "Inconsistent within-character subvalues for '{}'->"
+                  + "'{}': {} != {}"
+                  ).format(
+                    key,
+                    subkey,
+                    rsub[subkey],
+                    ssub[subkey]
+                  )
+                )
+              # else keep original sub-value as they're the same
+            else:
+              rsub[subkey] = ssub[subkey]
+        elif result[key] != stats[key]:
+          raise ValueError(
+            "Inconsistent within-character values for '{}': {} != {}"
+            .format(
+              key,
+              result[key],
+              stats[key]
+            )
+          )
+        # else keep original value (e.g. for 'id')
+      else:
+        result[key] = stats[key]
+  for key in stats:
+    if isinstance(result[key], (int, float)):
+      result[key] /= len(variants)
+    elif isinstance(result[key], dict):
+      for subkey in result[key]:
+        if isinstance(result[key][subkey], (int, float)):
+          result[key][subkey] /= len(variants)
+  return result
+
+
+def analyze_job(job):
+  """
+  Worker entry point for main: analyzes a single (ch, cid, cdata) job,
+  returning the stats along with any unmatched normal move names.
+  """
+  ch, cid, cdata = job
+  unmatched = []
+  return analyze(ch, cdata, unmatched), unmatched
+
+
+def variant_ids(ch):
+  """
+  Returns the list of characterData.json IDs for the given character.
+  """
+  if isinstance(idmap[ch], (list, tuple)):
+    return list(idmap[ch])
+  else:
+    return [idmap[ch]]
+
+
+def collect_results(jobs, results):
+  """
+  Gathers analyze_job results (which arrive in job order, keeping each
+  character's variants in idmap order for merging) into a dictionary mapping
+  characters to lists of variant stats and one mapping characterData.json IDs
+  to lists of unmatched normal move names.
+  """
+  variants = {}
+  unmatched = {}
+  for (ch, cid, _), (stats, misses) in zip(jobs, results):
+    print("Analyzed {} ({}).".format(ch, cid))
+    variants.setdefault(ch, []).append(stats)
+    unmatched[cid] = misses
+  return variants, unmatched
 
-    for key in result:
-      print("  {}: {}".format(key, result[key]))
+
+def character_stats(chars, data, workers=None):
+  """
+  Analyzes the given characters (keys of idmap) using the given
+  characterData.json contents, spreading the work across the given number of
+  worker processes (all available cores by default, or inline if 1).
+  Returns a dictionary mapping each character to their stats (including
+  gender and skin tone), along with one mapping characterData.json IDs to
+  lists of unmatched normal move names. define_cprops must be called first.
+  """
+  jobs = [
+    (ch, cid, data[cid])
+      for ch in chars
+      for cid in variant_ids(ch)
+  ]
+  if workers == 1:
+    variants, unmatched = collect_results(jobs, map(analyze_job, jobs))
+  else:
+    with multiprocessing.Pool(workers) as pool:
+      variants, unmatched = collect_results(
+        jobs,
+        pool.imap(analyze_job, jobs)
+      )
+
+  chstats = {}
+  for ch in chars:
+    if len(variants[ch]) > 1:
+      result = merge_variants(variants[ch])
+    else:
+      result = variants[ch][0]
 
     result["gender"] = CPROPS[ch]["gender"]
     result["skin_tone"] = combined_tones[ch]
     chstats[ch] = result
 
+  return chstats, unmatched
+
+
+def main(workers=None, use_cache=True):
+  """
+  Analyzes every character (spreading the work across the given number of
+  worker processes; all available cores by default, or inline if 1), writes
+  out the results, and runs the hypothesis tests. See load_characters for
+  use_cache.
+  """
+  define_cprops()
+  data = load_characters(roster_ids(), use_cache=use_cache)
+
+  chstats, unmatched = character_stats(list(idmap), data, workers)
+  for ch in chstats:
+    print("{}:".format(ch))
+    for key in chstats[ch]:
+      print("  {}: {}".format(key, chstats[ch][key]))
+
+  report_unmatched(unmatched)
+
   print("Writing TSV...")
   with open(TSVFILE, 'w') as fout:
     writer = csv.writer(fout, dialect="excel-tab")
@@ -890,8 +1544,11 @@ def main():
       )
 
   print("Looking at rank sums...")
-  for index, pos, alt in hypotheses:
-    rp1, rp2 = rank_positions([chstats[ch] for ch in chstats], index, pos, alt)
+  rank_sums = rank_positions_batch(
+    [chstats[ch] for ch in chstats],
+    hypotheses
+  )
+  for (index, pos, alt), (rp1, rp2) in zip(hypotheses, rank_sums):
     print(
       " {}: {} -> {:.3g}; {} -> {:.3g}".format(
         index,
@@ -945,4 +1602,23 @@ def main():
       )
 
 if __name__ == "__main__":
-  main()
+  if sys.argv[1:] == ["corpus"]:
+    build_corpus()
+  elif sys.argv[1:] == ["check"]:
+    sys.exit(1 if check_corpus() else 0)
+  else:
+    workers = None
+    use_cache = True
+    args = sys.argv[1:]
+    while args:
+      flag = args.pop(0)
+      if flag in ("-j", "--workers") and args:
+        workers = int(args.pop(0))
+      elif flag == "--no-cache":
+        use_cache = False
+      else:
+        print(
+          "Usage: {} [corpus | check | [-j N] [--no-cache]]".format(sys.argv[0])
+        )
+        sys.exit(2)
+    main(workers, use_cache)
@@ -0,0 +1,107 @@
+"""
+reference_parsers.py
+
+The frame-data value parsers (stat_value, active_frames, on_hit and
+damage_values) as they were before process.py's were rewritten around
+precompiled patterns and caching, kept unchanged as the reference for the
+regression corpus: "./process.py corpus" records what these make of each
+raw value, and "./process.py check" compares process.py's parsers against
+that. Don't change these to match process.py.
+"""
+
+def stat_value(x):
+  if type(x) == str:
+    if x in ['?', '~', '-']:
+      return None
+    elif '+' in x:
+      bits = x.split('+')
+      vals = [float(b) for b in bits if b.strip().isdigit()]
+      return sum(vals)
+    elif '*' in x:
+      bits = x.split('*')
+      vals = [float(b) for b in bits if b.strip().isdigit()]
+      return sum(vals)
+    elif '(' in x:
+      return float(x[:x.index('(')])
+    else:
+      return float(x)
+  elif x is None:
+    return x
+  else:
+    return float(x)
+
+def active_frames(x):
+  if type(x) == str:
+    if '*' in x:
+      active = []
+      gaps = []
+      bits = x.split('*')
+      for i, b in enumerate(bits):
+        subact, subgaps = active_frames(b)
+        active.extend(subact)
+        gaps.extend(subgaps)
+        if i < len(bits) - 1:
+          gaps.append(0)
+      return (active, gaps)
+    elif x == '~':
+      return ([0], [])
+    else:
+      try:
+        active = []
+        gaps = []
+        norm = x.replace(")", "_").replace("(", "_")
+        bits = norm.split("_")
+        for i, b in enumerate(bits):
+          if b in ('', '~') and i == len(bits) - 1:
+            # ignore blank or ~ at end
+            continue
+          if i % 2 == 0:
+            active.append(float(b))
+          else:
+            gaps.append(float(b))
+        return (active, gaps)
+      except:
+        raise ValueError("Bad active frames value: '{}'".format(x))
+  return ([x], [])
+
+def on_hit(x):
+  if type(x) == str:
+    if "KD" in x:
+      return "knockdown"
+    elif x in ["?", "~"]:
+      return None
+    elif '/' in x:
+      return min(float(b) for b in x.split('/'))
+  else:
+    return x
+
+def damage_values(x):
+  if type(x) == str:
+    if " per dagger" in x:
+      x = x[:x.index(" per dagger")]
+
+    if "(" in x:
+      x = x[:x.index("(")]
+
+    if '/' in x:
+      x = x[:x.index("/")]
+
+    if x in "?~":
+      return None
+    elif '+' in x:
+      bits = x.split('+')
+      result = []
+      for b in bits:
+        result.extend(damage_values(b))
+      return result
+    else:
+      bits = x.split("*")
+      result = []
+      for b in bits:
+        if 'x' in b:
+          first, second = b.split('x')
+          b = float(first) * float(second)
+        result.append(float(b))
+      return result
+  else:
+    return [x]
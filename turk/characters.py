@@ -0,0 +1,23 @@
+"""
+characters.py
+
+Loads character information from all_chars.csv.
+"""
+
+import csv
+
+CHARS_FILE = "all_chars.csv"
+
+def read_characters(filename=CHARS_FILE):
+  """
+  Reads the given character CSV file, returning a list of rows, each a
+  dictionary mapping column names to values.
+  """
+  with open(filename, newline='') as fin:
+    return list(csv.DictReader(fin))
+
+def index_characters(rows):
+  """
+  Returns a dictionary mapping character IDs to their rows.
+  """
+  return { row["id"]: row for row in rows }
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+check_urls.py
+
+Checks that every image referenced by a HITs file exists, replacing the
+serial wget loop over unique_urls.csv. URLs are read from the HITs file in a
+single pass (see group_hits.image_refs) and checked concurrently, with at
+most CONCURRENCY requests in flight.
+
+URLs are checked where hits.csv points (render.IMAGE_HOST) unless they're
+moved to another base with "--base", for example:
+
+  ./check_urls.py --base http://localhost:8000/
+    checks against the local preview server (see serve.py)
+
+  ./check_urls.py --base .
+    checks that the files exist under the current directory
+
+Missing images are written as JSON to the "--output" file (default
+MISSING_FILE), each with its HTTP status or error and the HITs file lines
+and columns that use it, and the exit status is 1 if any are missing.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import group_hits
+import render
+
+CONCURRENCY = 16
+
+# Seconds to wait for each response
+TIMEOUT = 20
+
+MISSING_FILE = "missing.json"
+
+def relocate(url, base):
+  """
+  Moves a URL under render.IMAGE_HOST to the given base URL or directory.
+  """
+  if base == None or not url.startswith(render.IMAGE_HOST):
+    return url
+  rest = url[len(render.IMAGE_HOST):]
+  if "://" in base:
+    return base.rstrip('/') + '/' + rest
+  return os.path.join(base, *rest.split('/'))
+
+def check(location):
+  """
+  Returns None if the given URL or file exists, and otherwise its HTTP
+  status code or an error message.
+  """
+  if "://" not in location:
+    return None if os.path.isfile(location) else "no such file"
+
+  for method in ("HEAD", "GET"):
+    request = urllib.request.Request(location, method=method)
+    try:
+      with urllib.request.urlopen(request, timeout=TIMEOUT):
+        return None
+    except urllib.error.HTTPError as e:
+      # Some servers don't support HEAD
+      if method == "HEAD" and e.code in (405, 501):
+        continue
+      return e.code
+    except (urllib.error.URLError, OSError) as e:
+      return str(getattr(e, "reason", e))
+
+async def check_all(locations, concurrency=CONCURRENCY):
+  """
+  Checks the given URLs or files with at most the given number in flight at
+  once, returning a mapping from each to its check result.
+  """
+  loop = asyncio.get_running_loop()
+  limit = asyncio.Semaphore(concurrency)
+
+  with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+    async def bounded(location):
+      async with limit:
+        return await loop.run_in_executor(executor, check, location)
+
+    results = await asyncio.gather(*(bounded(loc) for loc in locations))
+  return dict(zip(locations, results))
+
+def missing_report(refs, base=None, concurrency=CONCURRENCY):
+  """
+  Checks every URL in the given mapping (as from group_hits.image_refs),
+  returning a report dictionary listing the missing ones.
+  """
+  located = { url: relocate(url, base) for url in refs }
+  results = asyncio.run(check_all(sorted(set(located.values())), concurrency))
+  missing = [
+    {
+      "url": url,
+      "checked": located[url],
+      "error": results[located[url]],
+      "uses": [{ "line": line, "column": col } for line, col in refs[url]],
+    }
+      for url in sorted(refs)
+      if results[located[url]] != None
+  ]
+  return {
+    "base": base or render.IMAGE_HOST,
+    "checked": len(results),
+    "missing": missing,
+  }
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Checks that the images used by HITs exist."
+  )
+  parser.add_argument("hits", nargs='?', default="hits.csv")
+  parser.add_argument("--base", help="base URL or directory to check against")
+  parser.add_argument("-o", "--output", default=MISSING_FILE)
+  parser.add_argument("-j", "--concurrency", type=int, default=CONCURRENCY)
+  parser.add_argument(
+    "--no-variants",
+    action="store_true",
+    help="only check the full-size images, not srcset variants"
+  )
+  args = parser.parse_args()
+
+  refs = group_hits.image_refs(args.hits, not args.no_variants)
+  report = missing_report(refs, args.base, args.concurrency)
+  with open(args.output, 'w') as fout:
+    json.dump(report, fout, indent=1)
+
+  for entry in report["missing"]:
+    print("Missing: {} ({})".format(entry["checked"], entry["error"]))
+  print(
+    "{} of {} images missing; see '{}'.".format(
+      len(report["missing"]),
+      report["checked"],
+      args.output
+    )
+  )
+  if report["missing"]:
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -2,11 +2,23 @@
 """
 Reads groups.csv and all_chars.csv and prints out CSV lines suitable for input
 into Amazon Mechanical Turk to instantiate template-likert.html.
+
+Run with "--srcset" to add srcset columns (SRCSET_COLUMNS), filled in from
+the image variants listed in each game's images/*/clean/.manifest.json
+(written by images/prep.py), for use with template-likert-srcset.html;
+otherwise there are no such columns and HITs just use the full-size images.
+
+Run with "--urls" to instead list every image URL in hits.csv.
 """
 
 import csv
+import json
+import mimetypes
+import os
 import sys
 
+import characters
+
 IMAGE_URLS = {
   "sfv": {
     "A": "http://web.mit.edu/pmwh/www/enfreakment-images/clean/sfv_cs_{}.jpg",
@@ -21,6 +33,19 @@ IMAGE_URLS = {
 }
 FLAG_URL = "http://web.mit.edu/pmwh/www/enfreakment-images/flags/{}.png"
 
+# Written by images/prep.py, listing each clean image's variants
+VARIANTS_MANIFESTS = [
+  "images/sfv/clean/.manifest.json",
+  "images/tk7/clean/.manifest.json",
+]
+
+# Alternate formats offered through <source> elements, by column prefix, in
+# order of preference
+SOURCE_TYPES = {
+  "avif": "image/avif",
+  "webp": "image/webp",
+}
+
 GENDER_GROUPS = {
   "male": "men",
   "female": "women",
@@ -28,104 +53,211 @@ GENDER_GROUPS = {
   "ambiguous_female": "women", # official female pronouns
 }
 
-groups = []
-with open("groups.csv", newline='') as fin:
-  reader = csv.reader(fin)
-  for row in reader:
-    groups.append(row)
-
-with open("all_chars.csv") as fin:
-  raw = fin.readlines()
-
-rows = []
-keys = raw[0][:-1].split(',')
-for raw_row in raw[1:]:
-  bits = []
-  while raw_row:
-    if raw_row[0] == '"':
-      eq = raw_row[1:].index('"')
-      bits.append(raw_row[1:eq+1])
-      raw_row = raw_row[eq+3:]
-    else:
-      if ',' in raw_row:
-        ni = raw_row.index(',')
-        bits.append(raw_row[:ni])
-        raw_row = raw_row[ni+1:]
-      else:
-        bits.append(raw_row[:-1])
-        raw_row = ''
-
-  if len(bits) != len(keys):
-    print(
-      "Error: wrong number of bits ({} != {}):\n{}".format(
-        len(bits),
-        len(keys),
-        ','.join(bits)
-      ),
-      file=sys.stderr
-    )
-  rows.append({})
-  for i in range(len(keys)):
-    rows[-1][keys[i]] = bits[i]
-
-nr = len(rows)
-
-#for gr in groups:
-#  print(", ".join(rows[i-1]["name"] for i in gr))
-
-#print("Groupings:", len(groups))
-
-head = (
-  "id1,name1,shortname1,namepossessive1,imageA1,imageB1,imageC1,"
-  "country1,gender1,gendergroup1,bio1,quote1,"
-)
-head += (
-  "id2,name2,shortname2,namepossessive2,imageA2,imageB2,imageC2,"
-  "country2,gender2,gendergroup2,bio2,quote2,"
-)
-head += (
-  "id3,name3,shortname3,namepossessive3,imageA3,imageB3,imageC3,"
-  "country3,gender3,gendergroup3,bio3,quote3,"
-)
-head += (
-  "id4,name4,shortname4,namepossessive4,imageA4,imageB4,imageC4,"
-  "country4,gender4,gendergroup4,bio4,quote4,"
-)
-head += (
-  "id5,name5,shortname5,namepossessive5,imageA5,imageB5,imageC5,"
-  "country5,gender5,gendergroup5,bio5,quote5"
-)
-
-print(head)
-
-for gr in groups:
-  line = ""
-  for cid in gr:
-    selected = None
-    for r in rows:
-      if r["id"] == cid:
-        selected = r
-        break
-    if selected == None:
-      print(
-        "Error: Character '{}' does not exist!".format(cid),
-        file=sys.stderr
+def read_groups(filename="groups.csv"):
+  """
+  Reads the groups file, returning a list of lists of character IDs.
+  """
+  with open(filename, newline='') as fin:
+    return [row for row in csv.reader(fin)]
+
+# Per-character HIT columns (numbered 1-5 in the output)
+COLUMNS = [
+  "id",
+  "name",
+  "shortname",
+  "namepossessive",
+  "imageA",
+  "imageB",
+  "imageC",
+  "country",
+  "gender",
+  "gendergroup",
+  "bio",
+  "quote",
+]
+
+# Per-character columns added after imageC with "--srcset"
+SRCSET_COLUMNS = [
+  "{}{}".format(prefix, letter)
+    for prefix in ["srcset"] + list(SOURCE_TYPES)
+    for letter in "ABC"
+]
+
+# How many characters each HIT shows
+PER_HIT = 5
+
+def columns(srcset=False):
+  """
+  Returns the per-character column names, including SRCSET_COLUMNS if
+  srcset is True.
+  """
+  if not srcset:
+    return COLUMNS
+  at = COLUMNS.index("imageC") + 1
+  return COLUMNS[:at] + SRCSET_COLUMNS + COLUMNS[at:]
+
+def header(srcset=False):
+  """
+  Returns the list of HIT column names.
+  """
+  return [
+    "{}{}".format(col, n)
+      for n in range(1, PER_HIT + 1)
+      for col in columns(srcset)
+  ]
+
+def read_variants(filenames=VARIANTS_MANIFESTS):
+  """
+  Reads image prep manifests, returning a mapping from clean image file
+  names to lists of their variants (dictionaries with "file", "width" and
+  "type" keys). Raises a ValueError if a manifest is missing.
+  """
+  variants = {}
+  for filename in filenames:
+    if not os.path.exists(filename):
+      raise ValueError(
+        "No image variants manifest '{}'; run 'make prep-images' (or"
+        " images/prep.py) first.".format(filename)
       )
-    iubase = IMAGE_URLS[selected["game"]]
-    line+=(
-      '{id},{fn},{nm},{np},{imA},{imB},{imC},{co},{gd},{gg},"{bi}","{qu}",'
-    ).format(
-      id=selected["id"],
-      fn=selected["name"],
-      nm=selected["shortname"],
-      np=selected["possessive"],
-      imA=iubase["A"].format(selected["id"]), # character select
-      imB=iubase["B"].format(selected["id"]), # official art
-      imC=iubase["C"].format(selected["id"]), # in-game
-      co=selected["country"],
-      gd=selected["gender"],
-      gg=GENDER_GROUPS[selected["gender"]],
-      bi=selected["bio"],
-      qu=selected["quote"]
-    )
-  print(line[:-1]) # remove trailing comma
+    with open(filename, 'r') as fin:
+      for name, entry in json.load(fin).items():
+        variants[name] = entry["variants"]
+  return variants
+
+def srcset(url, variants, mime_type):
+  """
+  Returns a srcset attribute value listing the variants of the image at the
+  given URL that have the given MIME type, which are expected to live next
+  to it. Returns an empty string if there aren't any.
+  """
+  base, name = url.rsplit('/', 1)
+  return ", ".join(
+    "{}/{} {}w".format(base, v["file"], v["width"])
+      for v in variants.get(name, [])
+      if v["type"] == mime_type
+  )
+
+def character_fields(selected, variants=None):
+  """
+  Returns the HIT column values (in columns() order) for one character,
+  including the srcset columns if image variants (as from read_variants) are
+  given.
+  """
+  iubase = IMAGE_URLS[selected["game"]]
+  urls = [
+    iubase["A"].format(selected["id"]), # character select
+    iubase["B"].format(selected["id"]), # official art
+    iubase["C"].format(selected["id"]), # in-game
+  ]
+  srcsets = []
+  if variants != None:
+    srcsets = [
+      srcset(url, variants, mimetypes.guess_type(url)[0])
+        for url in urls
+    ] + [
+      srcset(url, variants, mime_type)
+        for mime_type in SOURCE_TYPES.values()
+        for url in urls
+    ]
+  return [
+    selected["id"],
+    selected["name"],
+    selected["shortname"],
+    selected["possessive"],
+  ] + urls + srcsets + [
+    selected["country"],
+    selected["gender"],
+    GENDER_GROUPS[selected["gender"]],
+    selected["bio"],
+    selected["quote"],
+  ]
+
+def hit_rows(groups, by_id, variants=None):
+  """
+  Yields one list of HIT column values per group, given a mapping from
+  character IDs to character rows and optionally image variants (for the
+  srcset columns).
+  """
+  for gr in groups:
+    row = []
+    for cid in gr:
+      if cid not in by_id:
+        raise ValueError("Character '{}' does not exist!".format(cid))
+      row.extend(character_fields(by_id[cid], variants))
+    yield row
+
+def image_urls(hits_file="hits.csv"):
+  """
+  Reads a HITs file and returns every image URL in it, in column order.
+  """
+  with open(hits_file, newline='') as fin:
+    rows = list(csv.DictReader(fin))
+  return [
+    row["{}{}".format(col, n)]
+      for n in range(1, PER_HIT + 1)
+      for col in ("imageA", "imageB", "imageC")
+      for row in rows
+  ]
+
+def srcset_urls(value):
+  """
+  Returns the URLs in a srcset attribute value.
+  """
+  return [
+    candidate.strip().split(' ')[0]
+      for candidate in value.split(',')
+      if candidate.strip()
+  ]
+
+def image_refs(hits_file="hits.csv", variants=True):
+  """
+  Reads a HITs file once and returns a mapping from each image URL in it
+  (including srcset candidates, unless variants is False) to a list of
+  (line number, column name) pairs where it appears.
+  """
+  columns = ["image", "srcset"] + list(SOURCE_TYPES) if variants else ["image"]
+  refs = {}
+  with open(hits_file, newline='') as fin:
+    reader = csv.DictReader(fin)
+    for row in reader:
+      for n in range(1, PER_HIT + 1):
+        for prefix in columns:
+          for letter in "ABC":
+            col = "{}{}{}".format(prefix, letter, n)
+            value = row.get(col) or ""
+            if prefix == "image":
+              urls = [value] if value else []
+            else:
+              urls = srcset_urls(value)
+            for url in urls:
+              refs.setdefault(url, []).append((reader.line_num, col))
+  return refs
+
+def main():
+  if sys.argv[1:] == ["--urls"]:
+    for url in image_urls():
+      print(url)
+    return
+
+  variants = None
+  if sys.argv[1:] == ["--srcset"]:
+    try:
+      variants = read_variants()
+    except ValueError as e:
+      print("Error: {}".format(e), file=sys.stderr)
+      sys.exit(1)
+
+  groups = read_groups()
+  by_id = characters.index_characters(characters.read_characters())
+
+  writer = csv.writer(sys.stdout, lineterminator='\n')
+  writer.writerow(header(variants != None))
+  try:
+    for row in hit_rows(groups, by_id, variants):
+      writer.writerow(row)
+  except ValueError as e:
+    print("Error: {}".format(e), file=sys.stderr)
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+prep.py
+
+Prepares stimulus images as described by per-game recipe files (like
+sfv/recipe.json and tk7/recipe.json), replacing the old conv*.sh and flip.sh
+ImageMagick scripts. Each image is decoded once, has all of its operations
+applied in memory, and is written to the recipe's output directory, with
+images spread across a pool of worker processes.
+
+A recipe looks like:
+
+  {
+    "output": "clean",
+    "steps": [
+      {
+        "inputs": "TEKKEN™7/*_cs_*.jpg",
+        "crop": [960, 1080, 0, 0],
+        "fill": [ { "color": "#28384f", "box": [310, 70, 416, 97] } ],
+        "resize": 1024,
+        "flip": { "names": "flipped.csv", "file": "tk7_cs_{}.jpg" }
+      }
+    ],
+    "variants": { "widths": [320, 640], "formats": ["webp", "avif"] }
+  }
+
+where paths are relative to the recipe file and every operation is optional
+(inputs with no operations are copied as-is):
+
+  crop: [width, height, x, y], as in ImageMagick's -crop WxH+X+Y
+  fill: rectangles to paint over, with inclusive [x0, y0, x1, y1] corners
+  resize: scale (up or down) to fit within a square of this size
+  flip: mirror horizontally the output files named by filling in "file" with
+    each line of the "names" file
+
+Output names are the input names. If the recipe has "variants", each output
+also gets scaled-down copies at the given widths (like tk7_cs_asuka-320w.jpg)
+and copies at each width plus full size in the given formats (like
+tk7_cs_asuka-320w.webp and tk7_cs_asuka-910w.webp) for use in srcset
+attributes. Formats that this Pillow can't write (often AVIF) are skipped.
+
+MANIFEST_NAME in the output directory records, for each output, a hash of its
+input's contents and operations along with its variants' file names, widths
+and MIME types. Inputs whose hash hasn't changed are skipped unless "--force"
+is given.
+
+Usage:
+
+  ./prep.py [-j WORKERS] [--force] RECIPE...
+"""
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+
+from PIL import Image, ImageDraw, ImageOps, features
+
+MANIFEST_NAME = ".manifest.json"
+
+# Encoder settings by file extension; JPEG quality matches ImageMagick's
+# default
+SAVE_OPTIONS = {
+  ".jpg": { "quality": 92 },
+  ".jpeg": { "quality": 92 },
+  ".png": {},
+  ".webp": { "quality": 80, "method": 6 },
+  ".avif": { "quality": 60, "speed": 8 },
+}
+
+MIME_TYPES = {
+  ".jpg": "image/jpeg",
+  ".jpeg": "image/jpeg",
+  ".png": "image/png",
+  ".webp": "image/webp",
+  ".avif": "image/avif",
+}
+
+def supported_formats(formats):
+  """
+  Returns the subset of the given variant formats (like "webp") that Pillow
+  can write here.
+  """
+  return [f for f in formats if features.check(f)]
+
+def read_recipe(filename):
+  """
+  Reads a recipe file, returning (output directory, jobs) where each job is
+  an (input file, output file, operations) tuple. Paths are resolved
+  relative to the recipe's directory.
+  """
+  base = os.path.dirname(os.path.abspath(filename))
+  with open(filename, 'r') as fin:
+    recipe = json.load(fin)
+
+  outdir = os.path.join(base, recipe["output"])
+  variants = None
+  if "variants" in recipe:
+    variants = {
+      "widths": sorted(recipe["variants"].get("widths", [])),
+      "formats": supported_formats(recipe["variants"].get("formats", [])),
+    }
+
+  jobs = []
+  for step in recipe["steps"]:
+    flipped = set()
+    if "flip" in step:
+      with open(os.path.join(base, step["flip"]["names"]), 'r') as fin:
+        flipped = set(
+          step["flip"]["file"].format(line.strip())
+            for line in fin
+            if line.strip()
+        )
+
+    ops = { key: step[key] for key in ("crop", "fill", "resize") if key in step }
+    for src in sorted(glob.glob(os.path.join(base, step["inputs"]))):
+      name = os.path.basename(src)
+      job_ops = dict(ops, flip=name in flipped)
+      if variants:
+        job_ops["variants"] = variants
+      jobs.append((src, os.path.join(outdir, name), job_ops))
+
+  return outdir, jobs
+
+def job_key(data, ops):
+  """
+  Hashes an input file's contents together with the operations to apply to
+  it.
+  """
+  digest = hashlib.sha256(data)
+  digest.update(json.dumps(ops, sort_keys=True).encode("utf-8"))
+  return digest.hexdigest()
+
+def apply_ops(image, ops):
+  """
+  Returns the result of applying the given recipe operations to an image.
+  """
+  if image.mode not in ("RGB", "RGBA", "L"):
+    image = image.convert("RGBA")
+
+  if "crop" in ops:
+    w, h, x, y = ops["crop"]
+    # Like ImageMagick, don't pad out crops that run past the edges
+    image = image.crop(
+      (x, y, min(x + w, image.width), min(y + h, image.height))
+    )
+
+  if "fill" in ops:
+    draw = ImageDraw.Draw(image)
+    for rect in ops["fill"]:
+      draw.rectangle(rect["box"], fill=rect["color"])
+
+  if "resize" in ops:
+    size = ops["resize"]
+    scale = size / max(image.width, image.height)
+    image = image.resize(
+      (
+        max(1, round(image.width * scale)),
+        max(1, round(image.height * scale))
+      ),
+      Image.LANCZOS
+    )
+
+  if ops.get("flip"):
+    image = ImageOps.mirror(image)
+
+  return image
+
+def save_image(image, filename):
+  ext = os.path.splitext(filename)[1].lower()
+  if ext in (".jpg", ".jpeg") and image.mode != "RGB":
+    image = image.convert("RGB")
+  image.save(filename, **SAVE_OPTIONS[ext])
+
+def write_variants(image, dst, spec):
+  """
+  Writes the scaled and re-encoded variants of an output image given by a
+  recipe's variants spec, returning a list of their manifest entries (the
+  full-size output itself included).
+  """
+  stem, ext = os.path.splitext(dst)
+  widths = [w for w in spec["widths"] if w < image.width] + [image.width]
+  scaled = {
+    w: image.resize(
+      (w, max(1, round(image.height * w / image.width))),
+      Image.LANCZOS
+    ) if w != image.width else image
+      for w in widths
+  }
+
+  entries = []
+  for fmt in [ext] + ["." + f for f in spec["formats"]]:
+    for w in widths:
+      if fmt == ext and w == image.width:
+        filename = dst
+      else:
+        filename = "{}-{}w{}".format(stem, w, fmt)
+        save_image(scaled[w], filename)
+      entries.append({
+        "file": os.path.basename(filename),
+        "width": w,
+        "type": MIME_TYPES[fmt.lower()],
+      })
+  return entries
+
+def outputs_exist(dst, entry):
+  """
+  Returns whether an output file and every variant file listed in its
+  manifest entry exist.
+  """
+  outdir = os.path.dirname(dst)
+  return os.path.exists(dst) and all(
+    os.path.exists(os.path.join(outdir, variant["file"]))
+      for variant in entry.get("variants", [])
+  )
+
+def prepare(job):
+  """
+  Prepares a single image (and its variants) for the given (input file,
+  output file, operations, previous manifest entry) job unless its key
+  matches the previous entry's and all of its outputs exist. Returns (output file,
+  manifest entry, whether it was written).
+  """
+  src, dst, ops, old = job
+  with open(src, 'rb') as fin:
+    data = fin.read()
+  key = job_key(data, ops)
+  if old != None and old["key"] == key and outputs_exist(dst, old):
+    return dst, old, False
+
+  image_ops = { op: value for op, value in ops.items() if op != "variants" }
+  if not any(image_ops.values()):
+    # Nothing to do, so don't re-encode it
+    with open(dst, 'wb') as fout:
+      fout.write(data)
+    image = None
+  else:
+    image = apply_ops(Image.open(io.BytesIO(data)), image_ops)
+    save_image(image, dst)
+
+  variants = []
+  if "variants" in ops:
+    if image == None:
+      image = apply_ops(Image.open(io.BytesIO(data)), {})
+    variants = write_variants(image, dst, ops["variants"])
+  return dst, { "key": key, "variants": variants }, True
+
+def prepare_recipe(filename, workers=None, force=False):
+  """
+  Prepares every image in the given recipe using a pool of the given number
+  of worker processes (all available cores if None). Returns the number of
+  images written and the number skipped as unchanged.
+  """
+  outdir, jobs = read_recipe(filename)
+  os.makedirs(outdir, exist_ok=True)
+
+  manifest_file = os.path.join(outdir, MANIFEST_NAME)
+  manifest = {}
+  if os.path.exists(manifest_file) and not force:
+    with open(manifest_file, 'r') as fin:
+      manifest = json.load(fin)
+
+  jobs = [
+    (src, dst, ops, manifest.get(os.path.basename(dst)))
+      for src, dst, ops in jobs
+  ]
+  if workers == 1:
+    results = map(prepare, jobs)
+  else:
+    pool = multiprocessing.Pool(workers)
+    results = pool.imap_unordered(prepare, jobs)
+
+  written = 0
+  updated = {}
+  try:
+    for dst, entry, wrote in results:
+      updated[os.path.basename(dst)] = entry
+      written += wrote
+  finally:
+    if workers != 1:
+      pool.close()
+      pool.join()
+    # Record whatever finished, so an interrupted run can pick up from there
+    manifest.update(updated)
+    with open(manifest_file, 'w') as fout:
+      json.dump(manifest, fout, indent=1, sort_keys=True)
+
+  return written, len(jobs) - written
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Prepares stimulus images from recipe files."
+  )
+  parser.add_argument("recipes", nargs='+', metavar="RECIPE")
+  parser.add_argument(
+    "-j",
+    "--workers",
+    type=int,
+    default=None,
+    help="number of worker processes (default: one per core)"
+  )
+  parser.add_argument(
+    "--force",
+    action="store_true",
+    help="re-prepare images even if they haven't changed"
+  )
+  args = parser.parse_args()
+
+  for recipe in args.recipes:
+    written, skipped = prepare_recipe(recipe, args.workers, args.force)
+    print(
+      "{}: prepared {} images ({} unchanged).".format(recipe, written, skipped)
+    )
+
+if __name__ == "__main__":
+  main()
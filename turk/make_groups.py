@@ -1,15 +1,34 @@
 #!/usr/bin/env python3
 """
 Reads all_chars.csv and divides the characters into groups, which it prints as
-CSV lines containing character indices.
+CSV lines containing character IDs.
+
+Only characters listed in characters.lp are used. Groups are found by
+simulated annealing from a start where each character already appears
+EVAL_COUNT times, using moves that swap members between two groups, until no
+group is homogeneous in any ENSURE_DIVERSITY property, no pair of characters
+appears together more often than a balanced design allows, and no
+FORBIDDEN_PAIRS appear at all (the same constraints as counterbalance.lp).
+
+Several independent restarts (each with its own seed derived from
+SEARCH_SEED) can be run across a process pool, keeping the best result; run
+with --help for options, including group size and evaluation count for
+sizing other study designs.
 """
 
-import csv
 import sys
+import re
+import math
+import random
+import argparse
+import statistics
 import collections
+import multiprocessing
 
 import numpy as np
 
+import characters
+
 # How many items per group
 GROUP_SIZE = 5
 
@@ -22,44 +41,73 @@ EVAL_COUNT = 7
 # Which columns should be diverse (have at least 2 values) within each group
 ENSURE_DIVERSITY = [
   "gender",
-  "origin"
+  "pronoun",
+  "origin",
+  "game",
+]
+
+# Derived "pronoun" column values
+PRONOUNS = {
+  "male": "he",
+  "ambiguous_male": "he",
+  "female": "she",
+  "ambiguous_female": "she",
+}
+
+# Pairs of characters that should never share a group
+FORBIDDEN_PAIRS = [
+  ("akuma", "akumat7"), # SFV Akuma vs. Tekken Akuma
 ]
 
+# File listing the characters to use in the study
+ROSTER_FILE = "characters.lp"
+
+# Search parameters
+SEARCH_SEED = 182081029
+SEARCH_STEPS = 200000
+START_TEMPERATURE = 1.0
+END_TEMPERATURE = 0.02
+
+# Penalty weights for constraint violations
+DUPLICATE_PENALTY = 10 # a character appearing twice in one group
+FORBIDDEN_PENALTY = 10 # per occurrence of a forbidden pair
+PAIR_PENALTY = 1 # per occurrence of a pair beyond the balanced maximum
+DIVERSITY_PENALTY = 1 # per homogeneous property per group
+COVERAGE_PENALTY = 10 # per appearance over/under EVAL_COUNT for a character
+
+def configure(group_size, eval_count):
+  """
+  Sets the study design parameters (GROUP_SIZE, PAIRS_PER_GROUP, and
+  EVAL_COUNT). Also used to initialize worker processes.
+  """
+  global GROUP_SIZE, PAIRS_PER_GROUP, EVAL_COUNT
+  GROUP_SIZE = group_size
+  PAIRS_PER_GROUP = (GROUP_SIZE * (GROUP_SIZE - 1)) // 2
+  EVAL_COUNT = eval_count
+
 def read_characters(filename):
+  return characters.read_characters(filename)
+
+def read_roster(filename):
+  """
+  Returns the list of character IDs declared with character/1 facts in the
+  given clingo file.
+  """
   with open(filename) as fin:
-    raw = fin.readlines()
-
-  rows = []
-  keys = raw[0][:-1].split(',')
-  for raw_row in raw[1:]:
-    bits = []
-    while raw_row:
-      if raw_row[0] == '"':
-        eq = raw_row[1:].index('"')
-        bits.append(raw_row[1:eq+1])
-        raw_row = raw_row[eq+3:]
-      else:
-        if ',' in raw_row:
-          ni = raw_row.index(',')
-          bits.append(raw_row[:ni])
-          raw_row = raw_row[ni+1:]
-        else:
-          bits.append(raw_row[:-1])
-          raw_row = ''
-
-    if len(bits) != len(keys):
-      print(
-        "Error: wrong number of bits ({} != {}):\n{}".format(
-          len(bits),
-          len(keys),
-          ','.join(bits)
-        )
-      )
-    rows.append({})
-    for i in range(len(keys)):
-      rows[-1][keys[i]] = bits[i]
+    return re.findall(r'^character\((\w+)\)\.', fin.read(), re.MULTILINE)
 
-  return rows
+def study_characters(chars, roster):
+  """
+  Filters character rows down to just those in the given roster (or keeps
+  them all if it's None), adding a "pronoun" column.
+  """
+  result = []
+  for row in chars:
+    if roster == None or row["id"] in roster:
+      row = dict(row)
+      row["pronoun"] = PRONOUNS[row["gender"]]
+      result.append(row)
+  return result
 
 def group_size(rows):
   n_groups = (len(rows) * EVAL_COUNT) / GROUP_SIZE
@@ -116,6 +164,248 @@ def homogeneous_rows(chars, grouping, prop):
 
   return homogeneous
 
+def pair_frequency_bounds(n_chars, n_groups):
+  """
+  Returns the minimum and maximum number of times each unordered pair of
+  characters should appear together in a balanced design.
+  """
+  total_pairs = PAIRS_PER_GROUP * n_groups
+  possible_pairs = (n_chars * (n_chars - 1)) // 2
+  low = total_pairs // possible_pairs
+  high = low if total_pairs % possible_pairs == 0 else low + 1
+  return low, high
+
+def forbidden_pairs(chars):
+  """
+  Returns a symmetric boolean matrix flagging the FORBIDDEN_PAIRS by index.
+  """
+  index = { row["id"]: i for i, row in enumerate(chars) }
+  result = np.zeros((len(chars), len(chars)), dtype=bool)
+  for a, b in FORBIDDEN_PAIRS:
+    if a in index and b in index:
+      result[index[a], index[b]] = True
+      result[index[b], index[a]] = True
+  return result
+
+class PairCounts:
+  """
+  Tracks a grouping along with how many times each pair of characters shares
+  a group (as a symmetric matrix whose diagonal counts duplicates within a
+  group) and how many members of each group have each value of each
+  ENSURE_DIVERSITY property. Running totals of the pair-balance penalty and
+  of the number of homogeneous (group, property) combinations are kept up to
+  date as members are swapped, so neither ever needs recomputing. Swaps can't
+  change how often each character appears, so that part of the penalty
+  (coverage) is only computed once.
+
+  The matrices are plain nested lists because indexing single elements of a
+  NumPy array is several times slower, and swaps touch nothing else; use
+  matrix() for a NumPy copy of the counts.
+  """
+  def __init__(self, chars, grouping):
+    nc = len(chars)
+    self.grouping = [[int(c) for c in row] for row in grouping]
+    self.low, self.high = pair_frequency_bounds(nc, len(self.grouping))
+
+    # Each pair's penalty is weight * max(0, count - allowed)
+    forbidden = forbidden_pairs(chars)
+    self.weight = [[PAIR_PENALTY] * nc for _ in range(nc)]
+    self.allowed = [[self.high] * nc for _ in range(nc)]
+    for a in range(nc):
+      for b in range(nc):
+        if a == b:
+          self.weight[a][b] = DUPLICATE_PENALTY
+          self.allowed[a][b] = 0
+        elif forbidden[a, b]:
+          self.weight[a][b] = FORBIDDEN_PENALTY
+          self.allowed[a][b] = 0
+
+    self.counts = [[0] * nc for _ in range(nc)]
+    for row in self.grouping:
+      for i in range(len(row)):
+        for j in range(i+1, len(row)):
+          self.counts[row[i]][row[j]] += 1
+          if row[i] != row[j]:
+            self.counts[row[j]][row[i]] += 1
+
+    self.values = [
+      [chars[c][prp] for prp in ENSURE_DIVERSITY]
+        for c in range(nc)
+    ]
+    self.value_counts = [
+      [collections.Counter(self.values[c][p] for c in row) for row in self.grouping]
+        for p in range(len(ENSURE_DIVERSITY))
+    ]
+
+    self.balance = sum(
+      self.pair_cost(a, b, self.counts[a][b])
+        for a in range(nc)
+        for b in range(a, nc)
+    )
+    self.homogeneity = sum(
+      len(counts) == 1
+        for per_group in self.value_counts
+        for counts in per_group
+    )
+    appearances = collections.Counter(c for row in self.grouping for c in row)
+    self.coverage = sum(
+      abs(appearances[c] - EVAL_COUNT)
+        for c in range(nc)
+    )
+
+  def pair_cost(self, a, b, count):
+    """
+    Returns the penalty for pair (a, b) occurring count times.
+    """
+    return self.weight[a][b] * max(0, count - self.allowed[a][b])
+
+  def matrix(self):
+    """
+    Returns the pair counts as a NumPy array.
+    """
+    return np.array(self.counts)
+
+  def penalty(self):
+    """
+    Returns the total constraint-violation penalty (0 if every constraint is
+    satisfied).
+    """
+    return (
+      self.balance
+    + DIVERSITY_PENALTY * self.homogeneity
+    + COVERAGE_PENALTY * self.coverage
+    )
+
+  def swap_deltas(self, g1, p1, g2, p2):
+    """
+    Returns the changes in the balance and homogeneity scores that swapping
+    the member at p1 in group g1 with the member at p2 in group g2 would
+    make, without changing anything.
+    """
+    a = self.grouping[g1][p1]
+    b = self.grouping[g2][p2]
+    if a == b:
+      return 0, 0
+    # Each other member m of g1 loses a pair with a and gains one with b, and
+    # vice versa for g2, so the net change for (a, m) is the negation of
+    # that for (b, m); members in both groups cancel out.
+    net = {}
+    for i, m in enumerate(self.grouping[g1]):
+      if i != p1:
+        net[m] = net.get(m, 0) - 1
+    for i, m in enumerate(self.grouping[g2]):
+      if i != p2:
+        net[m] = net.get(m, 0) + 1
+
+    balance = 0
+    ca = self.counts[a]
+    cb = self.counts[b]
+    wa = self.weight[a]
+    wb = self.weight[b]
+    la = self.allowed[a]
+    lb = self.allowed[b]
+    for m, change in net.items():
+      if change == 0:
+        continue
+      if m == a or m == b:
+        # Pairs involving both swapped members (or a duplicate) interact,
+        # so fall back to applying each pair change in turn
+        return self.careful_deltas(g1, p1, g2, p2)
+      count = ca[m]
+      balance += wa[m] * (
+        max(0, count + change - la[m]) - max(0, count - la[m])
+      )
+      count = cb[m]
+      balance += wb[m] * (
+        max(0, count - change - lb[m]) - max(0, count - lb[m])
+      )
+
+    return balance, self.homogeneity_delta(a, b, g1, g2)
+
+  def careful_deltas(self, g1, p1, g2, p2):
+    """
+    Slow path for swap_deltas that tallies the net change for every affected
+    pair separately.
+    """
+    a = self.grouping[g1][p1]
+    b = self.grouping[g2][p2]
+    changes = collections.Counter()
+    for g, p, old, new in ((g1, p1, a, b), (g2, p2, b, a)):
+      for i, m in enumerate(self.grouping[g]):
+        if i != p:
+          changes[(old, m) if old < m else (m, old)] -= 1
+          changes[(new, m) if new < m else (m, new)] += 1
+    balance = 0
+    for (x, y), change in changes.items():
+      if change != 0:
+        count = self.counts[x][y]
+        balance += self.pair_cost(x, y, count + change)
+        balance -= self.pair_cost(x, y, count)
+    return balance, self.homogeneity_delta(a, b, g1, g2)
+
+  def homogeneity_delta(self, a, b, g1, g2):
+    """
+    Returns the change in the number of homogeneous (group, property)
+    combinations from moving a from g1 to g2 and b from g2 to g1.
+    """
+    homogeneity = 0
+    for p in range(len(ENSURE_DIVERSITY)):
+      va = self.values[a][p]
+      vb = self.values[b][p]
+      if va != vb:
+        for g, out, into in ((g1, va, vb), (g2, vb, va)):
+          counts = self.value_counts[p][g]
+          distinct = len(counts) - (counts[out] == 1) + (into not in counts)
+          homogeneity += (distinct == 1) - (len(counts) == 1)
+    return homogeneity
+
+  def swap_delta(self, g1, p1, g2, p2):
+    """
+    Returns the change in total penalty that a swap (see swap_deltas) would
+    make.
+    """
+    balance, homogeneity = self.swap_deltas(g1, p1, g2, p2)
+    return balance + DIVERSITY_PENALTY * homogeneity
+
+  def swap(self, g1, p1, g2, p2, deltas=None):
+    """
+    Swaps the member at p1 in group g1 with the member at p2 in group g2. If
+    the swap's deltas have already been computed they can be passed in.
+    """
+    if deltas == None:
+      deltas = self.swap_deltas(g1, p1, g2, p2)
+    balance, homogeneity = deltas
+    a = self.grouping[g1][p1]
+    b = self.grouping[g2][p2]
+    self.replace(g1, p1, b)
+    self.replace(g2, p2, a)
+    self.balance += balance
+    self.homogeneity += homogeneity
+
+  def replace(self, g, pos, new):
+    """
+    Replaces the member at pos in group g, updating pair and value counts
+    (but not the running scores; see swap).
+    """
+    row = self.grouping[g]
+    old = row[pos]
+    for i, m in enumerate(row):
+      if i != pos:
+        self.counts[old][m] -= 1
+        if old != m:
+          self.counts[m][old] -= 1
+        self.counts[new][m] += 1
+        if new != m:
+          self.counts[m][new] += 1
+    row[pos] = new
+    for p in range(len(ENSURE_DIVERSITY)):
+      counts = self.value_counts[p][g]
+      ov = self.values[old][p]
+      counts[ov] -= 1
+      if counts[ov] == 0:
+        del counts[ov]
+      counts[self.values[new][p]] += 1
+
 def pairs_score(chars, grouping):
   """
   Computes the number times each possible pairing occurs in the given grouping,
@@ -254,25 +544,163 @@ def better_groupings(chars, grouping):
 
   return results
 
-def main():
+def balanced_configuration(chars, rng):
   """
-  Reads all_chars.csv and prints out generated groups.
+  Generates a random grouping in which each character appears exactly
+  EVAL_COUNT times (although possibly more than once in a single group).
+  """
+  n_groups = group_size(chars)
+  items = [i for i in range(len(chars)) for _ in range(EVAL_COUNT)]
+  rng.shuffle(items)
+  return np.array(items).reshape((n_groups, GROUP_SIZE))
+
+def penalty(chars, grouping):
+  """
+  Computes the total constraint-violation penalty for a grouping from
+  scratch (0 means every constraint is satisfied).
+  """
+  return PairCounts(chars, grouping).penalty()
+
+def anneal(chars, grouping, rng, steps=SEARCH_STEPS):
+  """
+  Improves the given grouping by simulated annealing, swapping members
+  between pairs of groups (which keeps every character's appearance count
+  fixed) and scoring each swap incrementally with a PairCounts. Returns the
+  best grouping found and its penalty, stopping early if that reaches 0.
   """
-  np.random.seed(182081029)
+  pc = PairCounts(chars, grouping)
+  ng = len(pc.grouping)
+  current = pc.penalty()
+  best = current
+  best_grouping = [list(row) for row in pc.grouping]
+  cooling = (END_TEMPERATURE / START_TEMPERATURE) ** (1 / max(1, steps))
+  temperature = START_TEMPERATURE
+  for step in range(steps):
+    if best == 0:
+      break
+    g1 = rng.randrange(ng)
+    g2 = rng.randrange(ng - 1)
+    if g2 >= g1:
+      g2 += 1
+    p1 = rng.randrange(GROUP_SIZE)
+    p2 = rng.randrange(GROUP_SIZE)
+    if pc.grouping[g1][p1] == pc.grouping[g2][p2]:
+      continue
+
+    deltas = pc.swap_deltas(g1, p1, g2, p2)
+    delta = deltas[0] + DIVERSITY_PENALTY * deltas[1]
+    if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+      pc.swap(g1, p1, g2, p2, deltas)
+      current += delta
+      if current < best:
+        best = current
+        best_grouping = [list(row) for row in pc.grouping]
+    temperature *= cooling
+
+  return np.array(best_grouping), best
+
+def restart_seeds(seed, restarts):
+  """
+  Derives independent seeds for the given number of search restarts from a
+  single base seed.
+  """
+  return [
+    int(s)
+      for s in np.random.SeedSequence(seed).generate_state(restarts)
+  ]
 
-  chars = read_characters("all_chars.csv")
+def search(job):
+  """
+  Runs a single search restart for the given (chars, seed, steps) job,
+  returning the best grouping found and its penalty.
+  """
+  chars, seed, steps = job
+  rng = random.Random(seed)
+  start = balanced_configuration(chars, rng)
+  return anneal(chars, start, rng, steps)
 
-  rc = random_configuration(chars)
+def best_of(chars, restarts, steps=SEARCH_STEPS, seed=SEARCH_SEED, workers=None):
+  """
+  Runs the given number of independent search restarts, spread across the
+  given number of worker processes (all available cores by default, or
+  inline if 1). Returns the best grouping (ties going to the earliest
+  restart) along with a list of every restart's penalty.
+  """
+  jobs = [(chars, s, steps) for s in restart_seeds(seed, restarts)]
+  if workers == 1 or restarts == 1:
+    results = [search(job) for job in jobs]
+  else:
+    with multiprocessing.Pool(
+      workers,
+      initializer=configure,
+      initargs=(GROUP_SIZE, EVAL_COUNT)
+    ) as pool:
+      results = pool.map(search, jobs)
 
-  print(homogeneous_rows(chars, rc, "gender"))
-  print(pairs_to_break(chars, rc))
+  scores = [score for _, score in results]
+  best = min(range(len(results)), key=lambda i: (scores[i], i))
+  return results[best][0], scores
 
-  print(diversity(chars, rc, "gender"))
-  print(diversity(chars, rc, "origin"))
-  print(pairs_score(chars, rc))
+def main():
+  """
+  Reads all_chars.csv and prints out generated groups.
+  """
+  parser = argparse.ArgumentParser(
+    description="Divides characters into counterbalanced groups."
+  )
+  parser.add_argument("--group-size", type=int, default=GROUP_SIZE)
+  parser.add_argument("--eval-count", type=int, default=EVAL_COUNT)
+  parser.add_argument("--restarts", type=int, default=1)
+  parser.add_argument("--workers", type=int, default=None)
+  parser.add_argument("--steps", type=int, default=SEARCH_STEPS)
+  parser.add_argument("--seed", type=int, default=SEARCH_SEED)
+  parser.add_argument(
+    "--all-characters",
+    action="store_true",
+    help="use every character in all_chars.csv instead of {}".format(
+      ROSTER_FILE
+    )
+  )
+  args = parser.parse_args()
+  configure(args.group_size, args.eval_count)
+
+  roster = None if args.all_characters else read_roster(ROSTER_FILE)
+  chars = study_characters(read_characters("all_chars.csv"), roster)
+  if group_size(chars) == None:
+    sys.exit(1)
+
+  grouping, scores = best_of(
+    chars,
+    args.restarts,
+    args.steps,
+    args.seed,
+    args.workers
+  )
+  if args.restarts > 1:
+    print(
+      (
+        "Penalties over {} restarts: min {}, median {}, max {}"
+      + " ({} fully satisfied)."
+      ).format(
+        len(scores),
+        min(scores),
+        statistics.median(scores),
+        max(scores),
+        scores.count(0)
+      ),
+      file=sys.stderr
+    )
+
+  score = min(scores)
+  if score != 0:
+    print(
+      "Error: best grouping found still has penalty {}.".format(score),
+      file=sys.stderr
+    )
+    sys.exit(1)
 
-  print('-'*80)
-  #print(better_groupings(chars, rc))
+  for row in grouping:
+    print(','.join(sorted(chars[i]["id"] for i in row)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+render.py
+
+Builds the HIT HTML pages, replacing the old vim scripts and sed rewrites:
+
+  ./render.py expand PRE OUT [--srcset]
+    Expands a .pre template (like template-likert.html.pre) by repeating its
+    single_character div once per character in a HIT, renumbering the copies
+    (what expand.vim did). With "--srcset", each character image becomes a
+    <picture> offering its width and format variants, for use with HITs
+    files made by "group_hits.py --srcset".
+
+  ./render.py instantiate TEMPLATE HITS OUT [--line N] [--images VARIANT]
+    Fills in a template's ${field} placeholders from line N of the HITs file
+    (what instantiate.vim did).
+
+  ./render.py batch TEMPLATE HITS OUTDIR [-j WORKERS]
+    Renders instance-N.html for the Nth data row of the HITs file (the header
+    doesn't count), plus an instance-N-local.html copy that loads images from
+    localhost, all in one pass.
+
+Images normally come from IMAGE_HOST; the "localhost" variant loads them from
+a local server (see serve.sh) and the "local" variant uses relative paths.
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import re
+
+import group_hits
+
+PLACEHOLDER = re.compile(r'\$\{(\w+)\}')
+
+TEMPLATE_FILE = "template-likert.html"
+HITS_FILE = "hits.csv"
+OUTPUT_DIR = "batch"
+INSTANCE_NAME = "instance-{}.html"
+LOCAL_INSTANCE_NAME = "instance-{}-local.html"
+
+# How many characters each HIT shows
+PER_HIT = 5
+
+# Marks the div that gets repeated once per character
+CHARACTER_DIV = re.compile(r'<div.*single_character')
+
+# Line of the HITs file used for previews (line 1 is the header)
+PREVIEW_LINE = 8
+
+# A character image cell in a .pre template
+IMAGE_CELL = re.compile(
+  r'^( *)<td> <img src="\$\{image([ABC])1\}"([^>]*)> </td>$',
+  re.MULTILINE
+)
+
+# Display width of each image, for choosing among srcset candidates
+IMAGE_SIZES = "30vw"
+
+IMAGE_HOST = "http://web.mit.edu/pmwh/www/enfreakment-images/"
+IMAGE_VARIANTS = {
+  "remote": IMAGE_HOST,
+  "localhost": "http://localhost:8000/",
+  "local": "",
+}
+
+class Template:
+  """
+  A template whose ${field} placeholders are located once up front, so that
+  rendering is just a join. Placeholders with no value are left as-is.
+  """
+  def __init__(self, text):
+    # Alternating literal text and field names, starting and ending with text
+    self.parts = PLACEHOLDER.split(text)
+
+  def fields(self):
+    """
+    Returns the set of field names used in the template.
+    """
+    return set(self.parts[1::2])
+
+  def render(self, values):
+    """
+    Returns the template text with placeholders replaced by the values in
+    the given dictionary.
+    """
+    result = []
+    for i, part in enumerate(self.parts):
+      if i % 2 == 0:
+        result.append(part)
+      elif part in values:
+        result.append(values[part])
+      else:
+        result.append("${" + part + "}")
+    return ''.join(result)
+
+def read_template(filename):
+  with open(filename, 'r') as fin:
+    return Template(fin.read())
+
+def read_hits(filename):
+  """
+  Reads a HITs file, returning a list of dictionaries mapping column names to
+  values.
+  """
+  with open(filename, newline='') as fin:
+    return list(csv.DictReader(fin))
+
+def expand(text, copies=PER_HIT):
+  """
+  Repeats the first single_character div (through the line after its closing
+  tag) so there's one per character, rewriting "1}" and '_1"' to use each
+  copy's number.
+  """
+  lines = text.split('\n')
+  start = None
+  for i, line in enumerate(lines):
+    if CHARACTER_DIV.search(line):
+      start = i
+      break
+  if start == None:
+    raise ValueError("Template has no single_character div.")
+
+  depth = 0
+  for end in range(start, len(lines)):
+    depth += lines[end].count("<div") - lines[end].count("</div>")
+    if depth == 0:
+      break
+  else:
+    raise ValueError("Unclosed single_character div.")
+
+  block = lines[start:end+2]
+  result = lines[:end+2]
+  for n in range(2, copies + 1):
+    result.extend(
+      line.replace("1}", "{}}}".format(n)).replace('_1"', '_{}"'.format(n))
+        for line in block
+    )
+  result.extend(lines[end+2:])
+  return '\n'.join(result)
+
+def with_srcset(text):
+  """
+  Rewrites each character image cell in a .pre template to use a <picture>
+  with <source> elements for the alternate formats in
+  group_hits.SOURCE_TYPES and a srcset for the image's own format, filled in
+  from the columns group_hits.py adds with "--srcset".
+  """
+  def picture(match):
+    indent, letter, attributes = match.groups()
+    lines = ["<td>", "  <picture>"]
+    for prefix, mime_type in group_hits.SOURCE_TYPES.items():
+      lines.append(
+        '    <source type="{}" srcset="${{{}{}1}}" sizes="{}">'.format(
+          mime_type,
+          prefix,
+          letter,
+          IMAGE_SIZES
+        )
+      )
+    lines.append(
+      '    <img src="${{image{0}1}}" srcset="${{srcset{0}1}}" sizes="{1}"{2}>'
+        .format(letter, IMAGE_SIZES, attributes)
+    )
+    lines.extend(["  </picture>", "</td>"])
+    return '\n'.join(indent + line for line in lines)
+
+  return IMAGE_CELL.sub(picture, text)
+
+def with_images(text, variant):
+  """
+  Rewrites image URLs in rendered text for the given IMAGE_VARIANTS variant.
+  """
+  return text.replace(IMAGE_HOST, IMAGE_VARIANTS[variant])
+
+def render_hit(job):
+  """
+  Renders the remote and localhost versions of a single instance for the
+  given (template, outdir, number, hit) job, returning the file names.
+  """
+  template, outdir, n, hit = job
+  text = template.render(hit)
+  remote = os.path.join(outdir, INSTANCE_NAME.format(n))
+  local = os.path.join(outdir, LOCAL_INSTANCE_NAME.format(n))
+  with open(remote, 'w') as fout:
+    fout.write(text)
+  with open(local, 'w') as fout:
+    fout.write(with_images(text, "localhost"))
+  return remote, local
+
+def render_instances(template, hits, outdir=OUTPUT_DIR, workers=1):
+  """
+  Writes remote and localhost versions of the template rendered for each HIT
+  row into outdir, spreading the work across the given number of processes
+  (all available cores if None). Returns the list of file names written.
+  """
+  os.makedirs(outdir, exist_ok=True)
+  jobs = [(template, outdir, n, hit) for n, hit in enumerate(hits, start=1)]
+  if workers == 1:
+    results = [render_hit(job) for job in jobs]
+  else:
+    with multiprocessing.Pool(workers) as pool:
+      results = pool.map(render_hit, jobs, chunksize=16)
+  return [filename for pair in results for filename in pair]
+
+def main():
+  parser = argparse.ArgumentParser(description="Builds HIT HTML pages.")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  cmd = commands.add_parser("expand")
+  cmd.add_argument("pre")
+  cmd.add_argument("out")
+  cmd.add_argument("--srcset", action="store_true")
+
+  cmd = commands.add_parser("instantiate")
+  cmd.add_argument("template")
+  cmd.add_argument("hits")
+  cmd.add_argument("out")
+  cmd.add_argument("--line", type=int, default=PREVIEW_LINE)
+  cmd.add_argument("--images", choices=sorted(IMAGE_VARIANTS), default="remote")
+
+  cmd = commands.add_parser("batch")
+  cmd.add_argument("template", nargs='?', default=TEMPLATE_FILE)
+  cmd.add_argument("hits", nargs='?', default=HITS_FILE)
+  cmd.add_argument("outdir", nargs='?', default=OUTPUT_DIR)
+  cmd.add_argument("-j", "--workers", type=int, default=1)
+
+  args = parser.parse_args()
+
+  if args.command == "expand":
+    with open(args.pre, 'r') as fin:
+      text = fin.read()
+    if args.srcset:
+      text = with_srcset(text)
+    text = expand(text)
+    with open(args.out, 'w') as fout:
+      fout.write(text)
+
+  elif args.command == "instantiate":
+    hits = read_hits(args.hits)
+    if not 2 <= args.line <= len(hits) + 1:
+      parser.error("line {} isn't a HIT in '{}'".format(args.line, args.hits))
+    text = read_template(args.template).render(hits[args.line - 2])
+    with open(args.out, 'w') as fout:
+      fout.write(with_images(text, args.images))
+
+  else:
+    template = read_template(args.template)
+    hits = read_hits(args.hits)
+    workers = None if args.workers == 0 else args.workers
+    written = render_instances(template, hits, args.outdir, workers)
+    print("Rendered {} files into '{}'.".format(len(written), args.outdir))
+
+if __name__ == "__main__":
+  main()
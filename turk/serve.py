@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+serve.py
+
+Serves the current directory for previewing HITs locally (template-
+localhost.html and batch/instance-*-local.html load their images from
+localhost:8000), replacing "python -m http.server":
+
+  - requests are handled on separate threads
+  - responses carry ETag and Last-Modified headers, and conditional requests
+    get "304 Not Modified"
+  - images are marked cacheable for a long time; HTML pages must be
+    revalidated, since they're regenerated often
+  - if the client accepts it and FILE.br or FILE.gz exists (and is at least as
+    new as FILE), that's sent instead with a Content-Encoding header (see
+    --precompress)
+  - recently served files are kept in memory, up to CACHE_BYTES
+
+Usage:
+
+  ./serve.py [--port PORT]
+    Serves until interrupted.
+
+  ./serve.py --precompress [FILE...]
+    Writes .gz (and .br, if the brotli module is installed) copies of the
+    given files (by default, the HTML files here and in batch/).
+
+  ./serve.py --load-test CLIENTS [--rounds N] [PAGE...]
+    Starts a server and has CLIENTS simultaneous clients each load every page
+    (by default, the batch/instance-*-local.html files) and all of its images
+    N times over, then reports throughput. Image URLs pointing at the default
+    port are redirected to PORT; if none of the pages reference any images
+    on the server, exits with an error rather than timing the HTML alone.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import email.utils
+import glob
+import gzip
+import http.server
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import render
+
+PORT = 8000
+
+# Total size of file contents kept in memory
+CACHE_BYTES = 256 << 20
+
+# Seconds that browsers may reuse images without asking again
+IMAGE_MAX_AGE = 7 * 24 * 60 * 60
+
+# Extensions of files worth precompressing (images are already compressed)
+COMPRESSIBLE = (".html", ".css", ".js", ".csv", ".svg", ".json")
+
+# Precompressed variants in order of preference, by Content-Encoding
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+LOCAL_PAGES = "batch/instance-*-local.html"
+
+# Finds image URLs in a page (including each srcset candidate)
+IMAGE_REF = re.compile(r'(?:src|srcset)="([^"]+)"')
+
+class FileCache:
+  """
+  A thread-safe least-recently-used cache of file contents, limited by total
+  size. Entries are keyed by path, modification time and size, so changed
+  files are read again.
+  """
+  def __init__(self, max_bytes=CACHE_BYTES):
+    self.max_bytes = max_bytes
+    self.size = 0
+    self.entries = collections.OrderedDict()
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def read(self, path, stat):
+    """
+    Returns the contents of the file at the given path, which has the given
+    os.stat result.
+    """
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with self.lock:
+      if key in self.entries:
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.entries[key]
+      self.misses += 1
+
+    with open(path, 'rb') as fin:
+      data = fin.read()
+
+    if len(data) <= self.max_bytes:
+      with self.lock:
+        if key not in self.entries:
+          self.entries[key] = data
+          self.size += len(data)
+        while self.size > self.max_bytes:
+          _, old = self.entries.popitem(last=False)
+          self.size -= len(old)
+    return data
+
+class PreviewHandler(http.server.SimpleHTTPRequestHandler):
+  """
+  Serves files like SimpleHTTPRequestHandler, adding validators, caching
+  headers, precompressed variants and an in-memory cache. Directory
+  listings are left to SimpleHTTPRequestHandler.
+  """
+  cache = FileCache()
+
+  # Keep connections open between requests
+  protocol_version = "HTTP/1.1"
+
+  def log_message(self, format, *args):
+    if not self.server.quiet:
+      super().log_message(format, *args)
+
+  def pick_variant(self, path, stat):
+    """
+    Returns (path, stat, encoding) for the best precompressed variant of
+    the given file that the client accepts, or for the file itself.
+    """
+    accepted = [
+      part.split(';')[0].strip()
+        for part in self.headers.get("Accept-Encoding", "").split(',')
+    ]
+    for encoding, ext in ENCODINGS:
+      if encoding not in accepted:
+        continue
+      try:
+        variant = os.stat(path + ext)
+      except OSError:
+        continue
+      if variant.st_mtime_ns >= stat.st_mtime_ns:
+        return path + ext, variant, encoding
+    return path, stat, None
+
+  def not_modified(self, etag, mtime):
+    """
+    Checks the request's conditional headers against the given ETag and
+    modification time (in whole seconds).
+    """
+    if "If-None-Match" in self.headers:
+      tags = [t.strip() for t in self.headers["If-None-Match"].split(',')]
+      return etag in tags or "*" in tags
+    if "If-Modified-Since" in self.headers:
+      try:
+        since = email.utils.parsedate_to_datetime(
+          self.headers["If-Modified-Since"]
+        )
+      except (TypeError, ValueError):
+        return False
+      return mtime <= since.timestamp()
+    return False
+
+  def send_head(self):
+    path = self.translate_path(self.path)
+    if os.path.isdir(path) or not os.path.isfile(path):
+      return super().send_head()
+
+    stat = os.stat(path)
+    ctype = self.guess_type(path)
+    source, source_stat, encoding = self.pick_variant(path, stat)
+    etag = '"{:x}-{:x}{}"'.format(
+      source_stat.st_mtime_ns,
+      source_stat.st_size,
+      "-" + encoding if encoding else ""
+    )
+
+    if self.not_modified(etag, int(stat.st_mtime)):
+      self.send_response(304)
+      self.send_validators(etag, stat, ctype, encoding)
+      self.end_headers()
+      return None
+
+    data = self.cache.read(source, source_stat)
+    self.send_response(200)
+    self.send_header("Content-Type", ctype)
+    self.send_header("Content-Length", str(len(data)))
+    if encoding:
+      self.send_header("Content-Encoding", encoding)
+    self.send_validators(etag, stat, ctype, encoding)
+    self.end_headers()
+    return data
+
+  def send_validators(self, etag, stat, ctype, encoding):
+    self.send_header("ETag", etag)
+    self.send_header("Last-Modified", self.date_time_string(stat.st_mtime))
+    self.send_header("Vary", "Accept-Encoding")
+    if ctype.startswith("image/"):
+      self.send_header(
+        "Cache-Control",
+        "public, max-age={}".format(IMAGE_MAX_AGE)
+      )
+    else:
+      self.send_header("Cache-Control", "no-cache")
+
+  def do_GET(self):
+    data = self.send_head()
+    if isinstance(data, bytes):
+      self.wfile.write(data)
+    elif data != None:
+      # A directory listing or error page from SimpleHTTPRequestHandler
+      try:
+        shutil.copyfileobj(data, self.wfile)
+      finally:
+        data.close()
+
+  def do_HEAD(self):
+    data = self.send_head()
+    if data != None and not isinstance(data, bytes):
+      data.close()
+
+def make_server(port=PORT, directory=".", quiet=False):
+  """
+  Returns a ThreadingHTTPServer serving the given directory on the given
+  port.
+  """
+  handler = lambda *args: PreviewHandler(*args, directory=directory)
+  server = http.server.ThreadingHTTPServer(("", port), handler)
+  server.daemon_threads = True
+  server.quiet = quiet
+  return server
+
+def precompress(filenames):
+  """
+  Writes a .gz copy (and .br copy, if brotli is installed) of each of the
+  given files.
+  """
+  try:
+    import brotli
+  except ImportError:
+    brotli = None
+
+  for filename in filenames:
+    with open(filename, 'rb') as fin:
+      data = fin.read()
+    with open(filename + ".gz", 'wb') as fout:
+      fout.write(gzip.compress(data, compresslevel=9))
+    if brotli != None:
+      with open(filename + ".br", 'wb') as fout:
+        fout.write(brotli.compress(data))
+
+  if brotli == None:
+    print("brotli isn't installed; only wrote .gz files.", file=sys.stderr)
+
+def page_urls(base, page, html):
+  """
+  Returns the absolute URLs of everything the given page (a path under the
+  base URL) references with src or srcset attributes on the same server.
+  Pages rendered with "--images localhost" hard-code the default port (see
+  render.IMAGE_VARIANTS), so those URLs are moved to the given base.
+  """
+  localhost = render.IMAGE_VARIANTS["localhost"]
+  urls = set()
+  for ref in IMAGE_REF.findall(html):
+    for candidate in ref.split(','):
+      url = candidate.strip().split(' ')[0]
+      if not url:
+        continue
+      url = urllib.parse.urljoin(base + page, url)
+      if url.startswith(localhost):
+        url = base + url[len(localhost):]
+      if url.startswith(base):
+        urls.add(url)
+  return sorted(urls)
+
+def load_client(base, pages, rounds):
+  """
+  Loads each page and everything it references, the given number of times,
+  the way a single browser without a cache would. Returns (requests, bytes,
+  errors) totals, counting bytes as sent (possibly compressed).
+  """
+  opener = urllib.request.build_opener()
+  opener.addheaders = [("Accept-Encoding", "gzip")]
+  requests = 0
+  received = 0
+  errors = 0
+  for _ in range(rounds):
+    for page in pages:
+      # HTTPError, URLError, and connection failures are all OSErrors
+      requests += 1
+      try:
+        with opener.open(base + page) as response:
+          data = response.read()
+          if response.headers.get("Content-Encoding") == "gzip":
+            html = gzip.decompress(data).decode("utf-8")
+          else:
+            html = data.decode("utf-8")
+      except OSError:
+        errors += 1
+        continue
+      received += len(data)
+      for url in page_urls(base, page, html):
+        requests += 1
+        try:
+          with opener.open(url) as response:
+            received += len(response.read())
+        except OSError:
+          errors += 1
+  return requests, received, errors
+
+def load_test(pages, clients, rounds=1, port=PORT):
+  """
+  Serves the current directory on the given port while the given number of
+  simultaneous clients load all of the given pages, then prints throughput
+  and cache statistics. Raises a ValueError if the pages don't reference
+  any images on the server.
+  """
+  base = "http://localhost:{}/".format(port)
+  images = 0
+  for page in pages:
+    with open(page, 'r', encoding="utf-8") as fin:
+      images += len(page_urls(base, page, fin.read()))
+  if images == 0:
+    raise ValueError(
+      "None of the pages reference images on {} (render them with"
+      " \"--images localhost\").".format(base)
+    )
+
+  server = make_server(port, quiet=True)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+
+  start = time.perf_counter()
+  try:
+    with concurrent.futures.ThreadPoolExecutor(clients) as pool:
+      totals = list(pool.map(
+        lambda _: load_client(base, pages, rounds),
+        range(clients)
+      ))
+  finally:
+    server.shutdown()
+  elapsed = time.perf_counter() - start
+
+  requests = sum(t[0] for t in totals)
+  received = sum(t[1] for t in totals)
+  errors = sum(t[2] for t in totals)
+  cache = PreviewHandler.cache
+  print(
+    "{} clients made {} requests ({} failed) for {:.1f} MB in {:.2f}s".format(
+      clients,
+      requests,
+      errors,
+      received / (1 << 20),
+      elapsed
+    )
+  )
+  print(
+    "{:.1f} requests/s, {:.1f} MB/s; cache hits: {}, misses: {}".format(
+      requests / elapsed,
+      received / (1 << 20) / elapsed,
+      cache.hits,
+      cache.misses
+    )
+  )
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Serves HIT previews with caching."
+  )
+  parser.add_argument("--port", type=int, default=PORT)
+  parser.add_argument("--precompress", action="store_true")
+  parser.add_argument("--load-test", type=int, metavar="CLIENTS")
+  parser.add_argument("--rounds", type=int, default=1)
+  parser.add_argument("files", nargs='*', metavar="FILE")
+  args = parser.parse_args()
+
+  if args.precompress:
+    files = args.files or [
+      f for f in glob.glob("*") + glob.glob("batch/*")
+        if f.endswith(COMPRESSIBLE)
+    ]
+    precompress(files)
+  elif args.load_test:
+    pages = args.files or sorted(glob.glob(LOCAL_PAGES))
+    if not pages:
+      parser.error("no pages to load (run 'make alllocal' first)")
+    try:
+      load_test(pages, args.load_test, args.rounds, args.port)
+    except ValueError as e:
+      print("Error: {}".format(e), file=sys.stderr)
+      sys.exit(1)
+  else:
+    server = make_server(args.port)
+    print("Serving on port {}...".format(args.port))
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      server.server_close()
+
+if __name__ == "__main__":
+  main()
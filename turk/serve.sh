@@ -1,2 +1,2 @@
 #!/bin/sh
-python -m http.server
+./serve.py "$@"
@@ -8,13 +8,28 @@ time.
 
 SEP = ','
 
+SEED = 2**30 + 48934979
+
 import sys
 import random
 
+def shuffle_rows(rows, seed=SEED):
+  """
+  Returns a copy of the given rows (lists of fields) with the fields in each
+  row shuffled, the same way as main would shuffle them as lines of text.
+  """
+  rng = random.Random(seed)
+  result = []
+  for row in rows:
+    row = list(row)
+    rng.shuffle(row)
+    result.append(row)
+  return result
+
 def main():
   fin = sys.stdin
   fout = sys.stdout
-  random.seed(2**30 + 48934979)
+  rows = []
   while True:
     try:
       line = fin.readline()
@@ -23,8 +38,8 @@ def main():
     if not line:
       break
     line = line[:-1] # remove newline
-    fields = line.split(SEP)
-    random.shuffle(fields)
+    rows.append(line.split(SEP))
+  for fields in shuffle_rows(rows):
     fout.write(','.join(fields) + '\n')
 
 if __name__ == "__main__":
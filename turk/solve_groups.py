@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+solve_groups.py
+
+Solves counterbalance.lp with characters.lp and prints the resulting groups
+as CSV lines of character IDs (shuffled as by shuffle_columns.py), replacing
+the clingo | sed | clingo | sed pipeline: groups come straight from the
+model's assigned/2 atoms, so report.lp doesn't need to be ground again with
+post.lp.
+
+Solves with the clingo Python API, exiting with an error if it isn't
+installed. With "--solver local", uses the local search in make_groups.py
+instead, which enforces the same constraints but finds a different grouping
+than the study's, so it's only meant for testing without clingo. The model
+is cached in MODEL_CACHE keyed by the solver and a hash of its inputs
+(characters.lp and counterbalance.lp, plus LOCAL_FILES for the local
+search), so it's only solved again when one of those changes; a cached
+local model never stands in for clingo's. With "--report FILE", also writes
+assigned/2 and count/2 facts in the same format as report.lp (for use with
+post.lp).
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import sys
+
+import make_groups
+import shuffle_columns
+
+PROGRAM_FILES = ["counterbalance.lp", "characters.lp"]
+
+# Further inputs to the local search
+LOCAL_FILES = ["all_chars.csv", "make_groups.py", "characters.py"]
+
+MODEL_CACHE = "groups-model.json"
+
+def program_hash(files=PROGRAM_FILES):
+  """
+  Returns a SHA-256 hex digest covering the contents of the given files.
+  """
+  digest = hashlib.sha256()
+  for filename in files:
+    with open(filename, 'rb') as fin:
+      digest.update(fin.read())
+  return digest.hexdigest()
+
+def solve_clingo(files=PROGRAM_FILES):
+  """
+  Grounds and solves the given files with clingo, returning the first
+  model's assigned/2 atoms as (group, character) pairs, or None if there's
+  no model.
+  """
+  import clingo
+
+  ctl = clingo.Control(["--models=1"])
+  for filename in files:
+    ctl.load(filename)
+  ctl.ground([("base", [])])
+  with ctl.solve(yield_=True) as handle:
+    for model in handle:
+      return [
+        (sym.arguments[0].number, sym.arguments[1].name)
+          for sym in model.symbols(shown=True)
+          if sym.name == "assigned" and len(sym.arguments) == 2
+      ]
+  return None
+
+def solve_local():
+  """
+  Finds an assignment with make_groups' local search, returning
+  (group, character) pairs like solve_clingo (or None if the search fails).
+  """
+  chars = make_groups.study_characters(
+    make_groups.read_characters("all_chars.csv"),
+    make_groups.read_roster(make_groups.ROSTER_FILE)
+  )
+  grouping, scores = make_groups.best_of(chars, 1)
+  if scores[0] != 0:
+    return None
+  return [
+    (g + 1, chars[c]["id"])
+      for g, row in enumerate(grouping)
+      for c in row
+  ]
+
+def clingo_available():
+  try:
+    import clingo
+    return True
+  except ImportError:
+    return False
+
+def solve(solver="auto", use_cache=True):
+  """
+  Returns (group, character) assignment pairs, from MODEL_CACHE if it was
+  found by the same solver from the same inputs and otherwise by solving
+  with the given solver ("clingo", or "local" for make_groups' local search;
+  "auto" is the same as "clingo"). Raises a ValueError if clingo is needed
+  but isn't installed, or if there's no solution.
+  """
+  if solver == "auto":
+    solver = "clingo"
+  files = PROGRAM_FILES + (LOCAL_FILES if solver == "local" else [])
+  key = program_hash(files)
+  if use_cache and os.path.exists(MODEL_CACHE):
+    with open(MODEL_CACHE, 'r') as fin:
+      cached = json.load(fin)
+    if cached["key"] == key and cached["solver"] == solver:
+      return [tuple(pair) for pair in cached["assigned"]]
+
+  if solver == "clingo":
+    if not clingo_available():
+      raise ValueError(
+        "The clingo Python module isn't installed; install it, or use"
+        " \"--solver local\" for a (different) test grouping."
+      )
+    assigned = solve_clingo()
+  else:
+    assigned = solve_local()
+  if assigned == None:
+    raise ValueError("No grouping satisfies the constraints.")
+
+  if use_cache:
+    with open(MODEL_CACHE, 'w') as fout:
+      json.dump(
+        { "key": key, "solver": solver, "assigned": sorted(assigned) },
+        fout,
+        indent=1
+      )
+  return assigned
+
+def group_rows(assigned):
+  """
+  Turns (group, character) pairs into one sorted list of characters per
+  group, in group order.
+  """
+  groups = collections.defaultdict(list)
+  for g, ch in assigned:
+    groups[g].append(ch)
+  return [sorted(groups[g]) for g in sorted(groups)]
+
+def write_report(assigned, filename):
+  """
+  Writes assigned/2 facts plus count/2 facts for every pair of characters
+  (like counterbalance.lp's shown atoms) to the given file.
+  """
+  rows = group_rows(assigned)
+  chars = sorted(set(ch for row in rows for ch in row))
+  pairs = collections.Counter(
+    (a, b)
+      for row in rows
+      for i, a in enumerate(row)
+      for b in row[i+1:]
+  )
+  with open(filename, 'w') as fout:
+    for g, ch in sorted(assigned):
+      fout.write("assigned({},{}).\n".format(g, ch))
+    for i, a in enumerate(chars):
+      for b in chars[i+1:]:
+        fout.write("count(p({},{}),{}).\n".format(a, b, pairs[(a, b)]))
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Solves for counterbalanced groups and prints them as CSV."
+  )
+  parser.add_argument(
+    "--solver",
+    choices=["auto", "clingo", "local"],
+    default="auto"
+  )
+  parser.add_argument("--no-cache", action="store_true")
+  parser.add_argument("--report", metavar="FILE")
+  args = parser.parse_args()
+
+  try:
+    assigned = solve(args.solver, not args.no_cache)
+  except ValueError as e:
+    print("Error: {}".format(e), file=sys.stderr)
+    sys.exit(1)
+  if args.report:
+    write_report(assigned, args.report)
+
+  for row in shuffle_columns.shuffle_rows(group_rows(assigned)):
+    sys.stdout.write(shuffle_columns.SEP.join(row) + '\n')
+
+if __name__ == "__main__":
+  main()